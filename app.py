@@ -1,58 +1,149 @@
 import os
-import logging
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
-
 class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+def create_app(config=None):
+    """Build the Flask app; `config` overrides the environment-derived settings.
+
+    Nothing here touches the database. Create or upgrade the schema with
+    `flask init-db` before serving.
+    """
+    # Create the app
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+
+    # Configure the database for MySQL (PythonAnywhere free tier)
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        # Default to SQLite for development/testing
+        database_url = "sqlite:///borrowbee.db"
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # Upload configuration
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    app.config['IMAGE_WORKERS'] = int(os.environ.get("IMAGE_WORKERS", 2))  # threads decoding cover uploads
+
+    # Seconds between availability expiry sweeps (0 disables the in-process sweeper)
+    app.config['AVAILABILITY_SWEEP_INTERVAL'] = int(os.environ.get("AVAILABILITY_SWEEP_INTERVAL", 300))
+
+    # Email outbox delivery (0 workers leaves delivery to `flask outbox-worker`)
+    app.config['EMAIL_OUTBOX_WORKERS'] = int(os.environ.get("EMAIL_OUTBOX_WORKERS", 2))
+    app.config['EMAIL_OUTBOX_POLL_INTERVAL'] = int(os.environ.get("EMAIL_OUTBOX_POLL_INTERVAL", 30))
+    app.config['EMAIL_MAX_ATTEMPTS'] = int(os.environ.get("EMAIL_MAX_ATTEMPTS", 6))
+    app.config['EMAIL_RETRY_BASE_DELAY'] = int(os.environ.get("EMAIL_RETRY_BASE_DELAY", 60))
+
+    # Seconds between checks for due owner notification digests (0 disables)
+    app.config['DIGEST_CHECK_INTERVAL'] = int(os.environ.get("DIGEST_CHECK_INTERVAL", 60))
+
+    # Cached anonymous listing pages (TTL 0 disables; set RESPONSE_CACHE_URL=redis://... to share between workers)
+    app.config['RESPONSE_CACHE_TTL'] = int(os.environ.get("RESPONSE_CACHE_TTL", 60))
+    app.config['RESPONSE_CACHE_MAX_BYTES'] = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+    app.config['RESPONSE_CACHE_URL'] = os.environ.get("RESPONSE_CACHE_URL")
+    # Seconds a listing ETag stays valid (0 disables listing 304s); without RESPONSE_CACHE_URL
+    # they are only sent when WEB_CONCURRENCY (server worker processes) is 1
+    app.config['LISTING_ETAG_MAX_AGE'] = int(os.environ.get("LISTING_ETAG_MAX_AGE", 300))
+    app.config['WEB_CONCURRENCY'] = int(os.environ.get("WEB_CONCURRENCY", 1))
+
+    # Rendered book-card fragments, per process (0 disables)
+    app.config['FRAGMENT_CACHE_MAX_BYTES'] = int(os.environ.get("FRAGMENT_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+    app.config['FRAGMENT_CACHE_TTL'] = int(os.environ.get("FRAGMENT_CACHE_TTL", 3600))
+
+    # Login/register throttling (set RATE_LIMIT_URL=redis://... to share buckets between workers)
+    app.config['RATE_LIMITS_ENABLED'] = os.environ.get("RATE_LIMITS_ENABLED", "1") != "0"
+    app.config['RATE_LIMIT_URL'] = os.environ.get("RATE_LIMIT_URL")
+    # Concurrent password hash computations per process, and seconds to wait for a free slot
+    app.config['PASSWORD_HASH_CONCURRENCY'] = int(os.environ.get("PASSWORD_HASH_CONCURRENCY", 4))
+    app.config['PASSWORD_HASH_WAIT'] = float(os.environ.get("PASSWORD_HASH_WAIT", 0.25))
+
+    # Seconds a logged-in user's identity is reused between requests (0 disables)
+    app.config['IDENTITY_CACHE_TTL'] = int(os.environ.get("IDENTITY_CACHE_TTL", 30))
+
+    # Logging: level, json or text output, and the share of high-volume info events kept
+    app.config['LOG_LEVEL'] = os.environ.get("LOG_LEVEL", "INFO").upper()
+    app.config['LOG_FORMAT'] = os.environ.get("LOG_FORMAT", "json")
+    app.config['LOG_SAMPLE_RATE'] = float(os.environ.get("LOG_SAMPLE_RATE", 0.1))
+    app.config['LOG_REQUEST_SAMPLE_RATE'] = float(os.environ.get("LOG_REQUEST_SAMPLE_RATE", 0.01))
+
+    # Per-request histograms and the slow-query log threshold; /metrics is only served
+    # when METRICS_TOKEN is set, to clients sending it as "Authorization: Bearer <token>"
+    app.config['METRICS_ENABLED'] = os.environ.get("METRICS_ENABLED", "1") != "0"
+    app.config['METRICS_TOKEN'] = os.environ.get("METRICS_TOKEN")
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get("SLOW_QUERY_MS", 200))
+
+    # Opt-in request profiler: signed X-Profile header or a sample rate; output ring under instance/
+    app.config['PROFILER_ENABLED'] = os.environ.get("PROFILER_ENABLED", "0") != "0"
+    app.config['PROFILER_SAMPLE_RATE'] = float(os.environ.get("PROFILER_SAMPLE_RATE", 0))
+    app.config['PROFILER_MODE'] = os.environ.get("PROFILER_MODE", "cprofile")  # cprofile, stack
+    app.config['PROFILER_DIR'] = os.environ.get("PROFILER_DIR", "profiles")
+    app.config['PROFILER_MAX_FILES'] = int(os.environ.get("PROFILER_MAX_FILES", 50))
+
+    if config:
+        app.config.update(config)
+
+    # Queue-backed logging with request IDs
+    from logging_setup import configure_logging
+    configure_logging(app)
+
+    # Per-request latency, SQL and template metrics
+    from metrics import init_metrics
+    init_metrics(app)
+
+    # On-demand request profiling (no hooks unless PROFILER_ENABLED)
+    from profiling import init_profiler
+    init_profiler(app)
 
-# Configure the database for MySQL (PythonAnywhere free tier)
-database_url = os.environ.get("DATABASE_URL")
-if not database_url:
-    # Default to SQLite for development/testing
-    database_url = "sqlite:///borrowbee.db"
+    # Initialize the app with the extension
+    db.init_app(app)
 
-app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # Import models so their tables are registered on db.metadata
+    import models
 
-# Upload configuration
-app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    # Register blueprints
+    from routes import main_bp
+    from auth import auth_bp
 
-# Initialize the app with the extension
-db.init_app(app)
+    app.register_blueprint(main_bp)
+    app.register_blueprint(auth_bp)
 
-# Import models
-import models
+    # Register CLI commands
+    from commands import register_commands
+    register_commands(app)
 
-with app.app_context():
-    # Create all tables
-    db.create_all()
+    # Template helpers
+    from fragments import register_template_helpers
+    register_template_helpers(app)
 
-    # Initialize database with sample data if empty
-    from database import init_database
-    init_database()
+    # Start background jobs with the first request rather than at import time
+    from availability import start_sweeper
+    from outbox import start_outbox_dispatcher
+    from digests import start_digest_scheduler
 
-# Register blueprints
-from routes import main_bp
-from auth import auth_bp
+    @app.before_request
+    def start_background_jobs():
+        start_sweeper(app)
+        start_outbox_dispatcher(app)
+        start_digest_scheduler(app)
 
-app.register_blueprint(main_bp)
-app.register_blueprint(auth_bp)
+    return app
 
 if __name__ == '__main__':
+    # Run as a script this file is __main__; import it as `app` so models share its db
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        from database import init_database
+        init_database()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,148 @@
+from flask import current_app, url_for
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+# Built assets live under static/dist; the manifest maps source to built name
+DIST_FOLDER = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+_ASSET_REFERENCE = re.compile(r"asset_url\(\s*['\"]([^'\"]+)['\"]\s*\)")
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def dist_folder():
+    """Directory the asset build writes to"""
+    return os.path.join(current_app.static_folder, DIST_FOLDER)
+
+
+def referenced_assets():
+    """Static files the templates load through asset_url(), sorted"""
+    assets = set()
+    for path in glob.glob(os.path.join(current_app.root_path, current_app.template_folder, '**', '*.html'), recursive=True):
+        with open(path, encoding='utf-8') as template:
+            assets.update(_ASSET_REFERENCE.findall(template.read()))
+    return sorted(assets)
+
+
+def minify_css(source):
+    """Drop comments and redundant whitespace from a stylesheet"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    return source.replace(';}', '}').strip()
+
+
+def minify_js(source):
+    """Strip indentation, blank lines and whole-line comments from a script.
+
+    Deliberately conservative: line breaks are kept so automatic semicolon
+    insertion behaves the same, and lines inside template literals are left
+    untouched.
+    """
+    lines = []
+    in_template = in_comment = False
+    for line in source.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if in_comment:
+                in_comment = '*/' not in stripped
+                continue
+            if stripped.startswith('/*') and ('*/' not in stripped or stripped.endswith('*/')):
+                in_comment = '*/' not in stripped
+                continue
+            if not stripped or stripped.startswith('//'):
+                continue
+            lines.append(stripped)
+        if line.count('`') % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def write_variants(path, content):
+    """Write a built asset with gzip (and brotli, if installed) siblings"""
+    with open(path, 'wb') as built:
+        built.write(content)
+    with open(f"{path}.gz", 'wb') as compressed:
+        compressed.write(gzip.compress(content, compresslevel=9, mtime=0))
+    try:
+        import brotli
+    except ImportError:
+        logging.warning("brotli is not installed; %s will be served without a .br variant", os.path.basename(path))
+        return
+    with open(f"{path}.br", 'wb') as compressed:
+        compressed.write(brotli.compress(content, quality=11))
+
+
+def build_assets():
+    """Minify and fingerprint every referenced asset and write the manifest.
+
+    Returns the manifest: source name -> fingerprinted name under dist/.
+    """
+    manifest = {}
+    output = dist_folder()
+    for asset in referenced_assets():
+        source_path = os.path.join(current_app.static_folder, asset)
+        base, extension = os.path.splitext(asset)
+        with open(source_path, 'rb') as source:
+            content = source.read()
+        minify = MINIFIERS.get(extension)
+        if minify:
+            content = minify(content.decode('utf-8')).encode('utf-8')
+
+        built_name = f"{base}.{hashlib.sha256(content).hexdigest()[:12]}{extension}"
+        built_path = os.path.join(output, built_name)
+        os.makedirs(os.path.dirname(built_path), exist_ok=True)
+        if not os.path.exists(built_path):
+            write_variants(built_path, content)
+        manifest[asset] = built_name
+
+    manifest_path = os.path.join(output, MANIFEST_NAME)
+    with open(f"{manifest_path}.tmp", 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    reset_manifest()
+    return manifest
+
+
+def load_manifest():
+    """The asset manifest, read once per process ({} until assets are built)"""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                try:
+                    with open(os.path.join(dist_folder(), MANIFEST_NAME)) as manifest_file:
+                        _manifest = json.load(manifest_file)
+                except FileNotFoundError:
+                    _manifest = {}
+                except ValueError as e:
+                    logging.error("Invalid asset manifest: %s", e)
+                    _manifest = {}
+    return _manifest
+
+
+def reset_manifest():
+    """Forget the loaded manifest so the next lookup rereads it"""
+    global _manifest
+    _manifest = None
+
+
+def asset_url(filename):
+    """URL of a static asset, fingerprinted when the build has produced one"""
+    built_name = load_manifest().get(filename)
+    if built_name:
+        return url_for('main.asset_file', filename=built_name)
+    return url_for('static', filename=filename)
@@ -3,6 +3,8 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
 from models import User
+from identity import current_user
+from throttling import throttle, verify_password, hashing_slot, too_many_requests, HashingBusy
 import logging
 
 auth_bp = Blueprint('auth', __name__)
@@ -25,8 +27,8 @@ def admin_required(f):
             flash('Please log in to access this page.', 'error')
             return redirect(url_for('auth.login'))
         
-        user = User.query.get(session['user_id'])
-        if not user or not user.is_admin():
+        user = current_user()
+        if not user or not user.is_admin:
             flash('Admin access required.', 'error')
             return redirect(url_for('main.index'))
         
@@ -34,6 +36,7 @@ def admin_required(f):
     return decorated_function
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
+@throttle('login', 'login.html')
 def login():
     """User login"""
     if request.method == 'POST':
@@ -47,7 +50,7 @@ def login():
             
             user = User.query.filter_by(email=email).first()
             
-            if user and user.check_password(password):
+            if verify_password(user, password):
                 session['user_id'] = user.id
                 session['username'] = user.username
                 
@@ -61,13 +64,17 @@ def login():
             else:
                 flash('Invalid username or password.', 'error')
                 
+        except HashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return too_many_requests('login.html', 1)
         except Exception as e:
-            logging.error(f"Login error: {e}")
+            logging.error("Login error: %s", e)
             flash('Login failed. Please try again.', 'error')
     
     return render_template('login.html')
 
 @auth_bp.route('/register', methods=['GET', 'POST'])
+@throttle('register', 'register.html')
 def register():
     """User registration"""
     if request.method == 'POST':
@@ -104,7 +111,8 @@ def register():
                 username=username,
                 email=email
             )
-            user.set_password(password)
+            with hashing_slot():
+                user.set_password(password)
             
             db.session.add(user)
             db.session.commit()
@@ -112,8 +120,11 @@ def register():
             flash('Registration successful! Please log in.', 'success')
             return redirect(url_for('auth.login'))
             
+        except HashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return too_many_requests('register.html', 1)
         except Exception as e:
-            logging.error(f"Registration error: {e}")
+            logging.error("Registration error: %s", e)
             db.session.rollback()
             flash('Registration failed. Please try again.', 'error')
     
@@ -0,0 +1,150 @@
+from app import db
+from models import Book
+from scheduler import start_periodic_job
+from response_cache import bump_catalog_version
+from datetime import datetime, timedelta
+import logging
+
+# Listing length in days for each availability period
+PERIOD_DAYS = {
+    '3days': 3,
+    'week': 7,
+    'month': 30,
+}
+DEFAULT_PERIOD_DAYS = 7
+
+
+def period_days(availability_period):
+    """Number of days a book stays listed for an availability period"""
+    return PERIOD_DAYS.get(availability_period, DEFAULT_PERIOD_DAYS)
+
+
+def get_expiry_date(book):
+    """Date a book's availability window ends, or None without a start date"""
+    if not book.availability_start_date:
+        return None
+    return book.availability_start_date + timedelta(days=period_days(book.availability_period))
+
+
+def refresh_expiry(book):
+    """Store the book's computed expiry so SQL can filter and sort on it"""
+    book.availability_expires_at = get_expiry_date(book)
+    return book.availability_expires_at
+
+
+def backfill_expiry(batch_size=1000):
+    """Compute availability_expires_at for books that don't have it stored yet"""
+    try:
+        updated = 0
+        while True:
+            rows = db.session.query(
+                Book.id, Book.availability_period, Book.availability_start_date
+            ).filter(
+                Book.availability_expires_at.is_(None),
+                Book.availability_start_date.isnot(None)
+            ).limit(batch_size).all()
+            if not rows:
+                break
+            db.session.bulk_update_mappings(Book, [
+                {
+                    'id': book_id,
+                    'availability_expires_at': start_date + timedelta(days=period_days(period))
+                }
+                for book_id, period, start_date in rows
+            ])
+            db.session.commit()
+            updated += len(rows)
+        if updated:
+            logging.info("Backfilled availability expiry for %s books", updated)
+        return updated
+    except Exception as e:
+        logging.error("Error backfilling availability expiry: %s", e)
+        db.session.rollback()
+        raise
+
+
+def listed_condition(now=None):
+    """SQL condition for books that are active, available and not yet expired"""
+    return db.and_(
+        Book.active == True,
+        Book.available == True,
+        Book.availability_expires_at > (now or datetime.utcnow())
+    )
+
+
+def get_availability_status(book):
+    """Calculate availability status with countdown; never writes to the database"""
+    expiry_date = get_expiry_date(book)
+    if expiry_date is None:
+        return {
+            'status': 'expired',
+            'color': 'red',
+            'message': 'No start date',
+            'expired': True,
+            'available': book.available,
+            'days_left': 0
+        }
+
+    current_date = datetime.utcnow()
+
+    if current_date > expiry_date:
+        return {
+            'status': 'expired',
+            'color': 'red',
+            'message': 'Expired',
+            'expired': True,
+            'available': False,
+            'days_left': 0
+        }
+    else:
+        days_left = (expiry_date - current_date).days
+        return {
+            'status': 'active',
+            'color': 'green',
+            'message': f"Active ({days_left} days left)",
+            'expired': False,
+            'available': book.available,
+            'days_left': days_left
+        }
+
+
+def availability_changed_at(book, now=None):
+    """When get_availability_status() last started returning its current message"""
+    expiry_date = get_expiry_date(book)
+    if expiry_date is None:
+        return None
+    now = now or datetime.utcnow()
+    if now > expiry_date:
+        return expiry_date
+    # The "days left" count last ticked over a whole number of days before expiry
+    days_left = (expiry_date - now).days
+    return expiry_date - timedelta(days=days_left + 1)
+
+
+def expire_books():
+    """Mark every expired, still-available book unavailable with one bulk UPDATE"""
+    try:
+        expired = Book.query.filter(
+            Book.available == True,
+            Book.availability_expires_at <= datetime.utcnow()
+        ).update({'available': False}, synchronize_session=False)
+        db.session.commit()
+        if expired:
+            logging.info("Expired %s books", expired)
+            bump_catalog_version()
+        return expired
+    except Exception as e:
+        logging.error("Error expiring books: %s", e)
+        db.session.rollback()
+        raise
+
+
+def start_sweeper(app):
+    """Start the in-process expiry sweeper thread once per process.
+
+    Runs expire_books() every AVAILABILITY_SWEEP_INTERVAL seconds; an interval
+    of 0 disables it, e.g. when `flask expire-books` runs from cron instead.
+    """
+    return start_periodic_job(
+        app, 'availability-sweeper', app.config.get('AVAILABILITY_SWEEP_INTERVAL', 0), expire_books
+    )
@@ -0,0 +1,389 @@
+"""Benchmark the main routes and write latency and query counts as JSON.
+
+By default seeds a throwaway SQLite database and drives the routes through
+the Flask test client, counting SQL statements per request:
+
+    python benchmarks/route_benchmark.py --reviews 200000 --output before.json
+    python benchmarks/route_benchmark.py --reviews 200000 --output after.json --compare before.json
+
+--database reuses an already seeded database (see `flask seed`). --http
+drives a running server from several processes instead; queries per request
+then come from the server's /metrics endpoint (start it with METRICS_TOKEN
+and pass the same value as --metrics-token). Book ids are read from the
+server's /api/books, and --email must name an account on it whose password
+is --password (every `flask seed` account uses password123):
+
+    python benchmarks/route_benchmark.py --http http://127.0.0.1:5000 --email user7@example.com --processes 4 --duration 30
+
+A response counts as an error when it is not the route's normal output:
+an HTTP error, a redirect away from a page, a listing without books, a
+JSON fallback message, or (in-process only) an ERROR log record. The
+routes catch their own exceptions and answer 200, so status codes alone
+would time error pages as if they were real renders.
+"""
+import argparse
+import http.cookiejar
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Scenario name -> Flask endpoint, for reading query counts from /metrics
+ENDPOINTS = {
+    'index_anonymous': 'main.index',
+    'index': 'main.index',
+    'books': 'main.books',
+    'book_detail': 'main.book_detail',
+    'dashboard': 'main.dashboard',
+    'submit_rating': 'main.submit_rating',
+    'borrow_request': 'main.api_borrow_request',
+}
+# Listings on a seeded database always link to books; their fallbacks render none
+LISTING_SCENARIOS = ('index_anonymous', 'index', 'books')
+_BOOK_LINK = re.compile(rb'/book/\d')
+# What the JSON routes answer from their `except` blocks
+JSON_SCENARIOS = ('submit_rating', 'borrow_request')
+FALLBACK_MESSAGES = ('Failed to submit rating', 'Failed to send request. Please try again.')
+# Deepest listing page visited; also the /api/books pages read for ids in --http mode
+BOOK_ID_PAGES = 50
+
+
+class ErrorRecords(logging.Handler):
+    """Collects ERROR log records, which the routes write before falling back"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def summarize(latencies_ms, queries=None, errors=0):
+    summary = {
+        'requests': len(latencies_ms),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies_ms, 0.50), 2),
+        'p95_ms': round(percentile(latencies_ms, 0.95), 2),
+        'p99_ms': round(percentile(latencies_ms, 0.99), 2),
+        'mean_ms': round(statistics.fmean(latencies_ms), 2),
+    }
+    if queries is not None:
+        summary['queries_per_request'] = round(queries, 2)
+    return summary
+
+
+def response_problem(name, path, status, body, final_path=None):
+    """Why a response is not the route's normal output, or None"""
+    if status >= 400:
+        return f"HTTP {status}"
+    requested_path = urllib.parse.urlsplit(path).path
+    # book_detail and dashboard redirect to the index when they fail
+    if 300 <= status < 400 or (final_path or requested_path) != requested_path:
+        return f"redirected from {requested_path}"
+    if name in LISTING_SCENARIOS and not _BOOK_LINK.search(body):
+        return "no books rendered"
+    if name in JSON_SCENARIOS:
+        try:
+            message = json.loads(body).get('message')
+        except ValueError:
+            return "response is not JSON"
+        if message in FALLBACK_MESSAGES:
+            return message
+    return None
+
+
+def report_problem(name, problem, reported):
+    """Print the first problem seen for each scenario"""
+    if name not in reported:
+        reported.add(name)
+        print(f"warning: {name}: {problem}", file=sys.stderr)
+
+
+def scenario_requests(rng, book_ids, page_count):
+    """(name, method, path, kwargs) for one pass over every scenario"""
+    popular = book_ids[:max(1, len(book_ids) // 100)]
+    return [
+        ('index_anonymous', 'GET', '/', {'anonymous': True}),
+        ('index', 'GET', f"/?page={rng.randint(1, 3)}", {}),
+        ('books', 'GET', f"/books?page={rng.randint(1, page_count)}", {}),
+        ('book_detail', 'GET', f"/book/{rng.choice(popular if rng.random() < 0.8 else book_ids)}", {}),
+        ('dashboard', 'GET', '/dashboard', {}),
+        ('submit_rating', 'POST', '/submit-rating', {'json': {'book_id': rng.choice(book_ids), 'rating': rng.randint(1, 5)}}),
+        ('borrow_request', 'POST', '/api/borrow-request', {'data': {'book_id': rng.choice(book_ids), 'message': 'Benchmark request'}}),
+    ]
+
+
+def run_in_process(args):
+    if not args.database:
+        db_path = os.path.join(tempfile.mkdtemp(), 'route_benchmark.db')
+        os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+    else:
+        os.environ['DATABASE_URL'] = args.database
+    sys.path.insert(0, ROOT)
+
+    from app import create_app, db
+    from sqlalchemy import event
+    from seeding import seed_database, SEED_PASSWORD
+
+    app = create_app({
+        'EMAIL_OUTBOX_WORKERS': 0,
+        'AVAILABILITY_SWEEP_INTERVAL': 0,
+        'DIGEST_CHECK_INTERVAL': 0,
+        'RATE_LIMITS_ENABLED': False,
+        'LOG_LEVEL': 'WARNING',
+    })
+    with app.app_context():
+        from database import init_database
+        from models import User, Book
+        from availability import listed_condition
+        init_database()
+        if not args.database:
+            print(f"Seeding: {seed_database(args.users, args.books, args.reviews, args.requests, args.seed)}")
+        # Benchmark as the busiest owner, who has the largest dashboard
+        user = User.query.order_by(User.pending_request_count.desc(), User.id).first()
+        book_ids = [row[0] for row in db.session.query(Book.id).filter(Book.active == True).order_by(Book.id)]
+        # /books lists only unexpired books, so only that many pages have content
+        page_count = max(1, min(BOOK_ID_PAGES, Book.query.filter(listed_condition()).count() // 12))
+        engine = db.engine
+
+    counter = {'queries': 0}
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_query(*unused):
+        counter['queries'] += 1
+
+    error_records = ErrorRecords()
+    logging.getLogger().addHandler(error_records)
+
+    anonymous = app.test_client()
+    client = app.test_client()
+    response = client.post('/login', data={'email': user.email, 'password': SEED_PASSWORD})
+    if response.status_code != 302:
+        raise SystemExit(f"Could not log in as {user.email}")
+
+    rng = random.Random(args.seed)
+    results = {}
+    reported = set()
+    for iteration in range(args.warmup + args.iterations):
+        for name, method, path, options in scenario_requests(rng, book_ids, page_count):
+            target = anonymous if options.pop('anonymous', False) else client
+            counter['queries'] = 0
+            error_records.messages.clear()
+            started = time.perf_counter()
+            response = target.open(path, method=method, **options)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            problem = response_problem(name, path, response.status_code, response.get_data())
+            if error_records.messages:
+                problem = f"logged error: {error_records.messages[0]}"
+            if problem:
+                report_problem(name, problem, reported)
+            if iteration < args.warmup:
+                continue
+            result = results.setdefault(name, {'latencies': [], 'queries': [], 'errors': 0})
+            result['latencies'].append(elapsed_ms)
+            result['queries'].append(counter['queries'])
+            if problem:
+                result['errors'] += 1
+
+    return {
+        name: summarize(result['latencies'], statistics.fmean(result['queries']), result['errors'])
+        for name, result in results.items()
+    }
+
+
+def logged_in_opener(base_url, email, password):
+    """URL opener holding a session cookie for `email`, or None if login fails"""
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    with opener.open(base_url + '/login', urllib.parse.urlencode({'email': email, 'password': password}).encode()) as response:
+        # A failed login renders the form again instead of redirecting
+        return None if urllib.parse.urlsplit(response.geturl()).path == '/login' else opener
+
+
+def http_worker(job):
+    """Run every scenario against a live server until the deadline"""
+    base_url, email, password, book_ids, deadline, seed = job
+    rng = random.Random(seed)
+    opener = logged_in_opener(base_url, email, password)
+    anonymous = urllib.request.build_opener()
+
+    page_count = max(1, min(BOOK_ID_PAGES, len(book_ids) // 12))
+    samples = []
+    while time.time() < deadline:
+        for name, method, path, options in scenario_requests(rng, book_ids, page_count):
+            target = anonymous if options.get('anonymous') else opener
+            body, headers = None, {}
+            if 'json' in options:
+                body, headers = json.dumps(options['json']).encode(), {'Content-Type': 'application/json'}
+            elif 'data' in options:
+                body = urllib.parse.urlencode(options['data']).encode()
+            started = time.perf_counter()
+            try:
+                with target.open(urllib.request.Request(base_url + path, data=body, headers=headers, method=method)) as response:
+                    content = response.read()
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                problem = response_problem(name, path, response.status, content, urllib.parse.urlsplit(response.geturl()).path)
+            except Exception as e:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                problem = str(e)
+            samples.append((name, elapsed_ms, problem))
+    return samples
+
+
+def fetch_book_ids(base_url):
+    """Ids of active books from the server's /api/books, newest first"""
+    book_ids = []
+    path = '/api/books'
+    for unused in range(BOOK_ID_PAGES):
+        with urllib.request.urlopen(base_url + path) as response:
+            payload = json.loads(response.read())
+        if not payload.get('success'):
+            raise SystemExit(f"Could not list books: {payload.get('message')}")
+        book_ids.extend(book['id'] for book in payload['books'])
+        if payload['next_cursor']:
+            path = f"/api/books?cursor={urllib.parse.quote(payload['next_cursor'])}"
+        elif payload['next_page']:
+            path = f"/api/books?page={payload['next_page']}"
+        else:
+            break
+    if not book_ids:
+        raise SystemExit(f"{base_url} has no books; seed it first with `flask seed`")
+    return book_ids
+
+
+def scrape_queries(base_url, token=None):
+    """{endpoint: (sql statement sum, request count)} from the server's /metrics"""
+    request = urllib.request.Request(base_url + '/metrics', headers={'Authorization': f"Bearer {token}"} if token else {})
+    try:
+        with urllib.request.urlopen(request) as response:
+            text = response.read().decode()
+    except urllib.error.HTTPError as e:
+        print(f"warning: no query counts, /metrics answered {e.code} (needs METRICS_TOKEN / --metrics-token)", file=sys.stderr)
+        return {}
+    totals = {}
+    for kind, endpoint, value in re.findall(r'^borrowbee_request_sql_queries_(sum|count)\{endpoint="([^"]+)"\} (\S+)$', text, re.M):
+        sums = totals.setdefault(endpoint, [0.0, 0.0])
+        sums[0 if kind == 'sum' else 1] = float(value)
+    return totals
+
+
+def run_http(args):
+    base_url = args.http.rstrip('/')
+    if not args.email:
+        raise SystemExit("--http needs --email, an account on that server")
+    if logged_in_opener(base_url, args.email, args.password) is None:
+        raise SystemExit(f"Could not log in as {args.email}")
+    book_ids = fetch_book_ids(base_url)
+    before = scrape_queries(base_url, args.metrics_token)
+    deadline = time.time() + args.duration
+    jobs = [(base_url, args.email, args.password, book_ids, deadline, args.seed + n) for n in range(args.processes)]
+    with multiprocessing.Pool(args.processes) as pool:
+        samples = [sample for worker_samples in pool.map(http_worker, jobs) for sample in worker_samples]
+    after = scrape_queries(base_url, args.metrics_token)
+
+    results = {}
+    reported = set()
+    for name, elapsed, problem in samples:
+        if problem:
+            report_problem(name, problem, reported)
+    for name in ENDPOINTS:
+        latencies = [elapsed for sample_name, elapsed, problem in samples if sample_name == name]
+        if not latencies:
+            continue
+        errors = sum(1 for sample_name, elapsed, problem in samples if sample_name == name and problem)
+        endpoint = ENDPOINTS[name]
+        query_sum = after.get(endpoint, [0, 0])[0] - before.get(endpoint, [0, 0])[0]
+        request_count = after.get(endpoint, [0, 0])[1] - before.get(endpoint, [0, 0])[1]
+        # index and index_anonymous share an endpoint, so they share this figure
+        results[name] = summarize(latencies, query_sum / request_count if request_count else None, errors)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def print_results(results, baseline=None):
+    print(f"\n{'route':<18}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'errors':>8}")
+    for name, result in results.items():
+        line = (f"{name:<18}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+                f"{result.get('queries_per_request') or 0:>9.1f}{result['errors']:>8}")
+        previous = (baseline or {}).get(name)
+        if previous:
+            line += f"   p50 {result['p50_ms'] - previous['p50_ms']:+.1f} ms, p95 {result['p95_ms'] - previous['p95_ms']:+.1f} ms"
+            if previous.get('queries_per_request') is not None and result.get('queries_per_request') is not None:
+                line += f", queries {result['queries_per_request'] - previous['queries_per_request']:+.1f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--reviews', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--database', help='SQLAlchemy URL of an already seeded database')
+    parser.add_argument('--http', help='base URL of a running server to load instead of the test client')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--duration', type=int, default=30, help='seconds of HTTP load')
+    parser.add_argument('--email', help='account to log in as in HTTP mode')
+    parser.add_argument('--password', default='password123')
+    parser.add_argument('--metrics-token')
+    parser.add_argument('--output', default='route_benchmark.json')
+    parser.add_argument('--compare', help='earlier output file to print differences against')
+    args = parser.parse_args()
+
+    results = run_http(args) if args.http else run_in_process(args)
+    report = {
+        'meta': {
+            'mode': 'http' if args.http else 'test-client',
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            # Only known when this run seeded its own database
+            'scale': None if args.http or args.database else {
+                'users': args.users, 'books': args.books, 'reviews': args.reviews, 'requests': args.requests
+            },
+            'iterations': args.iterations,
+            'seed': args.seed,
+        },
+        'routes': results,
+    }
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as previous:
+            baseline = json.load(previous)['routes']
+    print_results(results, baseline)
+    print(f"\nWrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Compare full-text search against the ILIKE search path.
+
+Builds a synthetic catalog in a throwaway SQLite database and times the same
+search terms through both paths:
+
+    python benchmarks/search_benchmark.py --books 100000 --repeat 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+WORDS = (
+    "dragon castle garden river shadow honey bee winter summer forest ocean "
+    "secret journey kingdom mystery science history magic robot star planet "
+    "island treasure silver golden night morning library school friend family "
+    "war peace love storm mountain city village captain doctor detective"
+).split()
+
+SEARCHES = ['dragon', 'honey bee', 'secret garden', 'detective', 'zzznomatch']
+
+
+def sentence(rng, length):
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'search_benchmark.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from app import create_app, db
+    from models import User, Book
+    from search import apply_search, ensure_search_index, search_backend
+
+    rng = random.Random(42)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        owner = User(username='bench', email='bench@example.com', password='x')
+        db.session.add(owner)
+        db.session.commit()
+
+        started = time.perf_counter()
+        db.session.execute(Book.__table__.insert(), [
+            {
+                'title': sentence(rng, 3).title(),
+                'author': f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}",
+                'description': sentence(rng, 40),
+                'category': rng.choice(['Fiction', 'Fantasy', 'History', 'Mystery']),
+                'available': True,
+                'active': True,
+                'user_id': owner.id,
+            }
+            for _ in range(args.books)
+        ])
+        db.session.commit()
+        print(f"Inserted {args.books} books in {time.perf_counter() - started:.2f}s")
+
+        started = time.perf_counter()
+        ensure_search_index(rebuild=True)
+        print(f"Indexed with {search_backend()} in {time.perf_counter() - started:.2f}s")
+
+        def ilike_query(term):
+            pattern = f"%{term}%"
+            return Book.query.filter(db.or_(
+                Book.title.ilike(pattern),
+                Book.author.ilike(pattern),
+                Book.description.ilike(pattern)
+            )).order_by(Book.created_at.desc())
+
+        def fts_query(term):
+            query, rank = apply_search(Book.query, term)
+            return query.order_by(rank, Book.created_at.desc())
+
+        print(f"\n{'search':<16}{'ilike ms':>12}{'fts ms':>12}{'speedup':>10}")
+        for term in SEARCHES:
+            timings = {}
+            for name, build in (('ilike', ilike_query), ('fts', fts_query)):
+                samples = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    query = build(term)
+                    query.order_by(None).count()
+                    query.limit(12).all()
+                    samples.append((time.perf_counter() - started) * 1000)
+                timings[name] = statistics.median(samples)
+            speedup = timings['ilike'] / timings['fts'] if timings['fts'] else float('inf')
+            print(f"{term:<16}{timings['ilike']:>12.1f}{timings['fts']:>12.1f}{speedup:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Time a fresh process from `import app` to its first served request.
+
+Each run starts a new interpreter against a throwaway SQLite database that
+already has the schema, and reports the import, app construction and first
+request phases. Point --path at another checkout to compare revisions:
+
+    python benchmarks/startup_benchmark.py --runs 10
+    git worktree add /tmp/before HEAD~1
+    python benchmarks/startup_benchmark.py --path /tmp/before
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Runs inside each child process; older checkouts build the app on import
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {path!r})
+import app as app_module
+imported = time.perf_counter()
+application = app_module.create_app() if hasattr(app_module, 'create_app') else app_module.app
+created = time.perf_counter()
+response = application.test_client().get('/about')
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({{
+    'import': (imported - started) * 1000,
+    'create_app': (created - imported) * 1000,
+    'first_request': (served - created) * 1000,
+    'total': (served - started) * 1000,
+}}))
+"""
+
+SETUP = """
+import sys
+sys.path.insert(0, {path!r})
+import app as app_module
+application = app_module.create_app() if hasattr(app_module, 'create_app') else app_module.app
+with application.app_context():
+    from database import init_database
+    init_database()
+"""
+
+
+def run_child(code, path, env):
+    result = subprocess.run(
+        [sys.executable, '-c', code.format(path=path)],
+        cwd=path, env=env, capture_output=True, text=True, check=True
+    )
+    return result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        help='checkout to measure (default: this one)')
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+    path = os.path.abspath(args.path)
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'startup_benchmark.db')
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{db_path}",
+        EMAIL_OUTBOX_WORKERS='0',
+        AVAILABILITY_SWEEP_INTERVAL='0',
+        DIGEST_CHECK_INTERVAL='0',
+    )
+    # Create the schema once so every timed run starts from the same database
+    run_child(SETUP, path, env)
+
+    samples = [json.loads(run_child(CHILD, path, env)) for _ in range(args.runs)]
+    print(f"{path} ({args.runs} runs, median ms)")
+    for phase in ('import', 'create_app', 'first_request', 'total'):
+        print(f"{phase:<16}{statistics.median(sample[phase] for sample in samples):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
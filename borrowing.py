@@ -0,0 +1,184 @@
+from app import db
+from models import User, Book, BorrowRequest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from datetime import datetime
+import logging
+
+
+def insert_or_ignore(table, values):
+    """Insert a row unless it violates a unique index; returns rows inserted.
+
+    On MySQL the count relies on an AUTO_INCREMENT key and is always 0 for
+    other tables.
+
+    Uses ON CONFLICT DO NOTHING on SQLite/PostgreSQL and a no-op ON
+    DUPLICATE KEY UPDATE on MySQL, so duplicates are rejected by the
+    database in a single statement. Every other error (foreign keys, NOT
+    NULL, truncation) still raises; MySQL's INSERT IGNORE would turn those
+    into warnings.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table).values(**values).on_conflict_do_nothing()
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table).values(**values).on_conflict_do_nothing()
+    elif dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        key = list(table.primary_key)[0]
+        # The drivers count matched rows, so rowcount is 1 for a duplicate too.
+        # Keep the key as is but zero LAST_INSERT_ID, so lastrowid tells them apart.
+        statement = insert(table).values(**values).on_duplicate_key_update({key.name: key + db.func.last_insert_id(0)})
+        return 1 if db.session.execute(statement).lastrowid else 0
+    else:
+        try:
+            with db.session.begin_nested():
+                return db.session.execute(table.insert().values(**values)).rowcount
+        except IntegrityError:
+            return 0
+    return db.session.execute(statement).rowcount
+
+
+def load_borrow_context(book_id, user_id):
+    """Book, owner, borrower and any active request of the borrower in one query"""
+    return db.session.execute(text("""
+        SELECT b.id, b.title, b.user_id, o.username as owner_username, o.email as owner_email,
+               o.notification_mode as owner_notification_mode,
+               u.username as borrower_username, u.email as borrower_email,
+               (SELECT r.status FROM borrow_requests r
+                WHERE r.book_id = b.id AND r.user_id = u.id
+                AND r.status IN ('pending', 'approved')
+                LIMIT 1) as existing_status
+        FROM books b
+        JOIN users o ON b.user_id = o.id
+        JOIN users u ON u.id = :user_id
+        WHERE b.id = :book_id AND b.active = TRUE
+    """), {'book_id': book_id, 'user_id': user_id}).fetchone()
+
+
+def _update_pending_counts(users):
+    """UPDATE on users that leaves updated_at alone.
+
+    Even Core updates apply the column's onupdate unless the statement sets
+    it; a counter change is not a profile edit, and updated_at feeds the
+    book detail validators.
+    """
+    return users.update().values(updated_at=users.c.updated_at)
+
+
+def adjust_pending_count(owner_id, delta):
+    """Move an owner's pending-request counter by delta in the caller's transaction"""
+    users = User.__table__
+    db.session.execute(_update_pending_counts(users).where(users.c.id == owner_id).values(
+        pending_request_count=db.func.coalesce(users.c.pending_request_count, 0) + delta
+    ))
+
+
+def create_borrow_request(book_id, user_id, owner_id, message, notify_now=True):
+    """Insert a pending borrow request unless the user already has an active one.
+
+    The unique index on (book_id, user_id, active_flag) makes this safe under
+    concurrent submits. Returns True if a request was created. A new request
+    costs two statements: the insert and the owner's counter update. The
+    caller commits.
+    """
+    now = datetime.utcnow()
+    created = insert_or_ignore(BorrowRequest.__table__, {
+        'book_id': book_id,
+        'user_id': user_id,
+        'message': message,
+        'status': 'pending',
+        'created_at': now,
+        'updated_at': now,
+        'owner_notified_at': now if notify_now else None
+    }) == 1
+    if created:
+        adjust_pending_count(owner_id, 1)
+    return created
+
+
+def respond_to_request(owner_id, request_id, status):
+    """Approve or reject a pending request on one of the owner's books.
+
+    The status only changes while the request is still pending, so a double
+    submit can't count twice. Returns True if it changed. The caller commits.
+    """
+    owned_books = db.select(Book.id).where(Book.user_id == owner_id)
+    updated = BorrowRequest.query.filter(
+        BorrowRequest.id == request_id,
+        BorrowRequest.status == 'pending',
+        BorrowRequest.book_id.in_(owned_books)
+    ).update({'status': status, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+    if updated:
+        adjust_pending_count(owner_id, -1)
+    return updated == 1
+
+
+def delete_book_requests(book):
+    """Remove a book's borrow requests before the book itself, keeping counters right"""
+    pending = BorrowRequest.query.filter_by(book_id=book.id, status='pending').count()
+    BorrowRequest.query.filter_by(book_id=book.id).delete(synchronize_session=False)
+    if pending:
+        adjust_pending_count(book.user_id, -pending)
+
+
+def outgoing_requests(user_id):
+    """A borrower's requests with book titles and owners, newest first, in one query"""
+    owner = aliased(User)
+    return db.session.query(BorrowRequest, Book.title, owner.username).join(
+        Book, BorrowRequest.book_id == Book.id
+    ).join(
+        owner, Book.user_id == owner.id
+    ).filter(
+        BorrowRequest.user_id == user_id
+    ).order_by(BorrowRequest.created_at.desc()).all()
+
+
+def incoming_requests(owner_id, page=1, per_page=10):
+    """One page of requests for an owner's books, pending first.
+
+    Returns (rows, has_next) where rows are (request, book_title,
+    borrower_username, borrower_email). Fetches one extra row instead of
+    counting; the pending total comes from User.pending_request_count.
+    """
+    borrower = aliased(User)
+    rows = db.session.query(BorrowRequest, Book.title, borrower.username, borrower.email).join(
+        Book, BorrowRequest.book_id == Book.id
+    ).join(
+        borrower, BorrowRequest.user_id == borrower.id
+    ).filter(
+        Book.user_id == owner_id
+    ).order_by(
+        db.case((BorrowRequest.status == 'pending', 0), else_=1),
+        BorrowRequest.created_at.desc(),
+        BorrowRequest.id.desc()
+    ).offset((page - 1) * per_page).limit(per_page + 1).all()
+    return rows[:per_page], len(rows) > per_page
+
+
+def rebuild_pending_counts():
+    """Recompute every owner's pending-request counter from borrow_requests"""
+    try:
+        counts = db.session.query(Book.user_id, db.func.count(BorrowRequest.id)).join(
+            BorrowRequest, BorrowRequest.book_id == Book.id
+        ).filter(
+            BorrowRequest.status == 'pending'
+        ).group_by(Book.user_id).all()
+
+        # One grouped scan, then reset and set only the owners with requests
+        users = User.__table__
+        updated = db.session.execute(_update_pending_counts(users).values(pending_request_count=0)).rowcount
+        if counts:
+            db.session.execute(
+                _update_pending_counts(users).where(users.c.id == db.bindparam('owner_id')).values(pending_request_count=db.bindparam('pending')),
+                [{'owner_id': owner_id, 'pending': pending} for owner_id, pending in counts]
+            )
+        db.session.commit()
+        return updated
+    except Exception as e:
+        logging.error("Error rebuilding pending request counts: %s", e)
+        db.session.rollback()
+        raise
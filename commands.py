@@ -0,0 +1,136 @@
+import click
+
+
+def register_commands(app):
+    """Register maintenance commands on the Flask CLI"""
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create tables and add missing columns, indexes and backfills"""
+        from database import init_database
+        init_database()
+        click.echo("Database schema is up to date")
+
+    @app.cli.command('profile-token')
+    @click.option('--mode', type=click.Choice(['cprofile', 'stack']), default='cprofile')
+    def profile_token_command(mode):
+        """Print an X-Profile header value that profiles requests (needs PROFILER_ENABLED)"""
+        from profiling import profile_token
+        click.echo(f"X-Profile: {profile_token(app, mode)}")
+
+    @app.cli.command('seed')
+    @click.option('--users', default=1000, show_default=True)
+    @click.option('--books', default=5000, show_default=True)
+    @click.option('--reviews', default=50000, show_default=True)
+    @click.option('--requests', 'borrow_requests', default=5000, show_default=True)
+    @click.option('--seed', default=42, show_default=True, help='Random seed, for repeatable data')
+    def seed_command(users, books, reviews, borrow_requests, seed):
+        """Bulk-insert skewed synthetic data for load testing (never run on production)"""
+        from seeding import seed_database, SEED_PASSWORD
+        counts = seed_database(users, books, reviews, borrow_requests, seed)
+        click.echo(f"Seeded {counts['users']} users, {counts['books']} books, {counts['reviews']} reviews "
+                   f"and {counts['borrow_requests']} borrow requests in {counts['seconds']}s "
+                   f"(password: {SEED_PASSWORD})")
+
+    @app.cli.command('rebuild-ratings')
+    def rebuild_ratings_command():
+        """Recompute per-book rating summaries from the reviews table"""
+        from ratings import rebuild_rating_summaries
+        count = rebuild_rating_summaries()
+        click.echo(f"Rebuilt rating summaries for {count} books")
+
+    @app.cli.command('rebuild-request-counters')
+    def rebuild_request_counters_command():
+        """Recompute every owner's pending borrow-request counter"""
+        from borrowing import rebuild_pending_counts
+        count = rebuild_pending_counts()
+        click.echo(f"Rebuilt pending request counters for {count} users")
+
+    @app.cli.command('set-admin')
+    @click.argument('email')
+    @click.option('--revoke', is_flag=True, help='Remove admin rights instead of granting them')
+    def set_admin_command(email, revoke):
+        """Grant or revoke a user's admin flag"""
+        from app import db
+        from models import User
+        from identity import invalidate_identity
+        user = User.query.filter_by(email=email).first()
+        if not user:
+            raise click.ClickException(f"No user with email {email}")
+        user.is_admin = not revoke
+        db.session.commit()
+        invalidate_identity(user.id)
+        click.echo(f"{user.username} is {'no longer' if revoke else 'now'} an admin")
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """Create or repopulate the full-text search index for books"""
+        from search import ensure_search_index
+        backend = ensure_search_index(rebuild=True)
+        click.echo(f"Search index ready (backend: {backend})")
+
+    @app.cli.command('expire-books')
+    def expire_books_command():
+        """Mark books whose availability period has ended as unavailable"""
+        from availability import expire_books
+        count = expire_books()
+        click.echo(f"Expired {count} books")
+
+    @app.cli.command('outbox-worker')
+    @click.option('--workers', type=int, default=None, help='Delivery threads (default EMAIL_OUTBOX_WORKERS)')
+    @click.option('--once', is_flag=True, help='Deliver everything due now, then exit')
+    def outbox_worker_command(workers, once):
+        """Deliver queued emails from the outbox with retries and backoff"""
+        from outbox import run_outbox_worker
+        delivered = run_outbox_worker(app, workers=workers, once=once)
+        click.echo(f"Processed {delivered} emails")
+
+    @app.cli.command('outbox-requeue')
+    def outbox_requeue_command():
+        """Retry dead-lettered outbox emails from scratch"""
+        from outbox import requeue_dead_emails
+        count = requeue_dead_emails()
+        click.echo(f"Requeued {count} emails")
+
+    @app.cli.command('send-digests')
+    def send_digests_command():
+        """Queue notification digests for owners whose digest window has passed"""
+        from digests import send_due_digests
+        count = send_due_digests()
+        click.echo(f"Queued {count} digests")
+
+    @app.cli.command('check-query-plans')
+    @click.option('--writes', is_flag=True, help='Also run the rating, borrow and dashboard POSTs (modifies the database)')
+    def check_query_plans_command(writes):
+        """EXPLAIN the queries behind the main pages and fail on full table scans"""
+        from query_plans import check_query_plans, UnsupportedDatabaseError
+        try:
+            checked, failures = check_query_plans(app, include_writes=writes)
+        except UnsupportedDatabaseError as e:
+            raise click.ClickException(str(e))
+        for label, statement, tables in failures:
+            click.echo(f"{label}: full scan of {', '.join(tables)}\n    {' '.join(statement.split())}", err=True)
+        click.echo(f"Checked {checked} queries, {len(failures)} with full table scans")
+        if not writes:
+            click.echo("Write routes not checked; pass --writes on a disposable seeded database to include them")
+        if failures:
+            raise SystemExit(1)
+
+    @app.cli.command('import-covers')
+    def import_covers_command():
+        """Resize covers stored as URLs or legacy uploads into thumbnail renditions"""
+        from images import import_existing_covers
+        from response_cache import bump_catalog_version
+        imported, failed = import_existing_covers()
+        if imported:
+            bump_catalog_version()
+        click.echo(f"Imported {imported} covers ({failed} failed)")
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Minify, fingerprint and precompress the CSS/JS templates reference"""
+        from assets import build_assets
+        manifest = build_assets()
+        for source, built in manifest.items():
+            click.echo(f"{source} -> {built}")
+        click.echo(f"Built {len(manifest)} assets")
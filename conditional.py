@@ -0,0 +1,173 @@
+from flask import current_app, g, make_response, request, session
+from app import db
+from models import User, Book, RatingSummary
+from availability import get_availability_status, availability_changed_at
+from response_cache import get_response_cache, response_cache_key
+from datetime import datetime, timezone
+from functools import wraps
+from types import SimpleNamespace
+import hashlib
+import json
+import logging
+import time
+
+
+def make_etag(*parts):
+    """Strong ETag value for a representation built from `parts`"""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def can_revalidate():
+    """Whether this request's page depends only on what the validators cover"""
+    return request.method == 'GET' and '_flashes' not in session
+
+
+def is_not_modified(etag, last_modified=None):
+    """Check the request's If-None-Match / If-Modified-Since against validators"""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified and request.if_modified_since:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.astimezone(timezone.utc).replace(tzinfo=None)
+    return False
+
+
+def add_validators(response, etag, last_modified=None):
+    """Attach ETag / Last-Modified and make clients revalidate on every visit"""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    """Empty 304 response carrying the current validators"""
+    return add_validators(make_response('', 304), etag, last_modified)
+
+
+def shared_catalog_version():
+    """Whether every worker sees the catalog version bumps this one sees.
+
+    A per-process version only follows this worker's writes, so with
+    several workers (WEB_CONCURRENCY) anything keyed on it can go stale.
+    """
+    return get_response_cache().shared or current_app.config.get('WEB_CONCURRENCY', 1) <= 1
+
+
+def _book_state(book_id):
+    """Timestamps and availability inputs a book's detail page depends on.
+
+    Cached in the response cache under the catalog version, so repeat checks
+    skip the database until a book, rating or profile write bumps it. Not
+    cached when other workers' writes wouldn't retire the entry.
+    """
+    cache = get_response_cache()
+    ttl = current_app.config.get('RESPONSE_CACHE_TTL', 0) if shared_catalog_version() else 0
+    key = f"{cache.catalog_version()}:validators:book:{book_id}"
+    cached = cache.get(key) if ttl else None
+    if cached is not None:
+        return json.loads(cached)
+
+    row = db.session.query(
+        Book.updated_at, Book.available, Book.availability_start_date, Book.availability_period,
+        User.updated_at.label('owner_updated_at'), RatingSummary.updated_at.label('summary_updated_at')
+    ).join(User, Book.user_id == User.id).outerjoin(
+        RatingSummary, RatingSummary.book_id == Book.id
+    ).filter(
+        Book.id == book_id,
+        Book.active == True
+    ).first()
+    state = None
+    if row:
+        state = {
+            'updated_at': row.updated_at and row.updated_at.isoformat(),
+            'owner_updated_at': row.owner_updated_at and row.owner_updated_at.isoformat(),
+            'summary_updated_at': row.summary_updated_at and row.summary_updated_at.isoformat(),
+            'available': row.available,
+            'availability_start_date': row.availability_start_date and row.availability_start_date.isoformat(),
+            'availability_period': row.availability_period
+        }
+    if ttl:
+        cache.set(key, json.dumps(state).encode(), ttl)
+    return state
+
+
+def book_validators(book_id):
+    """(etag, last_modified) for a book's detail page, or None if it can't be validated"""
+    if not can_revalidate():
+        return None
+    try:
+        state = _book_state(book_id)
+    except Exception as e:
+        logging.error("Error loading validators for book %s: %s", book_id, e)
+        return None
+    if not state:
+        return None
+
+    book = SimpleNamespace(
+        available=state['available'],
+        availability_period=state['availability_period'],
+        availability_start_date=state['availability_start_date'] and datetime.fromisoformat(state['availability_start_date'])
+    )
+    now = datetime.utcnow()
+    timestamps = [
+        datetime.fromisoformat(state[name])
+        for name in ('updated_at', 'owner_updated_at', 'summary_updated_at') if state[name]
+    ]
+    changed_at = availability_changed_at(book, now)
+    if changed_at:
+        timestamps.append(changed_at)
+
+    etag = make_etag(
+        'book', book_id, state['updated_at'], state['owner_updated_at'], state['summary_updated_at'],
+        get_availability_status(book)['message'], session.get('user_id')
+    )
+    return etag, max(timestamps) if timestamps else None
+
+
+def listing_etag_period():
+    """Current LISTING_ETAG_MAX_AGE window, or None when listings can't be validated"""
+    max_age = current_app.config.get('LISTING_ETAG_MAX_AGE', 0)
+    if not max_age or not shared_catalog_version():
+        return None
+    return int(time.time() // max_age)
+
+
+def conditional_listing(*params, defaults=None):
+    """Answer listing GETs with 304 while the catalog version is unchanged.
+
+    The ETag covers the catalog version, the page's normalized query
+    parameters and the logged-in user, so nothing is queried or rendered
+    for a repeat visit. It also rolls over every LISTING_ETAG_MAX_AGE
+    seconds, which bounds staleness when a version bump fails.
+    """
+    defaults = defaults or {}
+
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            if not can_revalidate():
+                return view(*args, **kwargs)
+            try:
+                etag = None
+                period = listing_etag_period()
+                if period is not None:
+                    etag = make_etag(
+                        'listing', get_response_cache().catalog_version(), period,
+                        response_cache_key(params, defaults), session.get('user_id')
+                    )
+            except Exception as e:
+                logging.error("Error computing listing ETag: %s", e)
+                return view(*args, **kwargs)
+            if not etag:
+                return view(*args, **kwargs)
+
+            if is_not_modified(etag):
+                return not_modified(etag)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not g.get('skip_response_cache'):
+                add_validators(response, etag)
+            return response
+        return decorated_function
+    return decorator
@@ -1,14 +1,59 @@
 from app import db
-from models import User, Book, Review, BorrowRequest
+from models import User, Book, Review, BorrowRequest, RatingSummary
 from werkzeug.security import generate_password_hash
+from sqlalchemy.schema import CreateColumn
 from datetime import datetime
 import logging
 
+def ensure_columns():
+    """Add model columns missing from existing tables (create_all skips them)"""
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_spec = CreateColumn(column).compile(dialect=db.engine.dialect)
+                    connection.execute(db.text(
+                        f"ALTER TABLE {table.name} ADD COLUMN {column_spec}"
+                    ))
+                    logging.info("Added column %s.%s", table.name, column.name)
+
+def ensure_indexes():
+    """Create model indexes missing from existing tables (create_all skips them)"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(db.engine, checkfirst=True)
+            except Exception as e:
+                # e.g. existing rows violate a new unique index; keep starting up
+                logging.error("Could not create index %s: %s", index.name, e)
+
 def init_database():
     """Initialize database with sample data that matches the PHP project"""
     try:
         # Create all tables
         db.create_all()
+        ensure_columns()
+        ensure_indexes()
+        
+        # Fill stored expiry timestamps for books created before the column existed
+        from availability import backfill_expiry
+        backfill_expiry()
+        
+        # Create the full-text search index if this database lacks one
+        from search import ensure_search_index
+        ensure_search_index()
+        
+        # Backfill rating summaries for databases created before they existed
+        if not RatingSummary.query.first() and Review.query.first():
+            from ratings import rebuild_rating_summaries
+            rebuild_rating_summaries()
+        
+        # Fill pending-request counters for users created before they existed
+        if User.query.filter(User.pending_request_count.is_(None)).first():
+            from borrowing import rebuild_pending_counts
+            rebuild_pending_counts()
         
         # Check if data already exists
         if User.query.first():
@@ -21,6 +66,6 @@ def init_database():
         logging.info("Database initialization completed")
         
     except Exception as e:
-        logging.error(f"Error initializing database: {e}")
+        logging.error("Error initializing database: %s", e)
         db.session.rollback()
         raise
\ No newline at end of file
@@ -0,0 +1,111 @@
+from app import db
+from models import User, Book, BorrowRequest
+from email_service import build_notification_email
+from outbox import enqueue_email, wake_outbox
+from scheduler import start_periodic_job
+from sqlalchemy.orm import aliased
+from datetime import datetime, timedelta
+import logging
+
+DEFAULT_DIGEST_INTERVAL_MINUTES = 15
+
+
+def build_digest_email(owner, requests):
+    """Subject and body of one digest covering several borrow requests.
+
+    `requests` is a list of (BorrowRequest, book_title, borrower_name,
+    borrower_email) rows.
+    """
+    count = len(requests)
+    subject = f"{count} new borrow request{'s' if count != 1 else ''}"
+    lines = [f"Hello {owner.username}!", "", f"You have {count} new book borrow request{'s' if count != 1 else ''} through BorrowBee:", ""]
+    for borrow_request, book_title, borrower_name, borrower_email in requests:
+        lines.extend([
+            f"📖 Book: {book_title}",
+            f"👤 Requested by: {borrower_name}",
+            f"📧 Contact: {borrower_email}",
+            f"💬 Message: {borrow_request.message or ''}",
+            ""
+        ])
+    lines.append("Please respond to these requests directly to arrange book borrowing details.")
+    return build_notification_email(subject, '\n'.join(lines))
+
+
+def digest_is_due(owner, now):
+    """Check if an owner's digest window has passed since their last digest"""
+    if not owner.last_digest_sent_at:
+        return True
+    interval = owner.digest_interval_minutes or DEFAULT_DIGEST_INTERVAL_MINUTES
+    return owner.last_digest_sent_at <= now - timedelta(minutes=interval)
+
+
+def send_due_digests():
+    """Queue one digest email per digest-mode owner whose window has passed.
+
+    Pending requests not yet notified are grouped per owner; each digest is
+    written to the outbox in the same transaction that marks its requests as
+    notified, so a request is never mailed twice or dropped.
+    """
+    now = datetime.utcnow()
+    try:
+        owners = db.session.query(User).join(Book, Book.user_id == User.id).join(
+            BorrowRequest, BorrowRequest.book_id == Book.id
+        ).filter(
+            User.notification_mode == 'digest',
+            BorrowRequest.status == 'pending',
+            BorrowRequest.owner_notified_at.is_(None)
+        ).distinct().all()
+        owners = {owner.id: owner for owner in owners if digest_is_due(owner, now)}
+        if not owners:
+            return 0
+
+        borrower = aliased(User)
+        rows = db.session.query(
+            BorrowRequest, Book.user_id, Book.title, borrower.username, borrower.email
+        ).join(Book, BorrowRequest.book_id == Book.id).join(
+            borrower, BorrowRequest.user_id == borrower.id
+        ).filter(
+            Book.user_id.in_(list(owners)),
+            BorrowRequest.status == 'pending',
+            BorrowRequest.owner_notified_at.is_(None)
+        ).order_by(BorrowRequest.created_at).all()
+
+        grouped = {}
+        for borrow_request, owner_id, book_title, borrower_name, borrower_email in rows:
+            grouped.setdefault(owner_id, []).append((borrow_request, book_title, borrower_name, borrower_email))
+
+        queued = 0
+        for owner_id, requests in grouped.items():
+            owner = owners[owner_id]
+            request_ids = [borrow_request.id for borrow_request, *_ in requests]
+
+            # Claim the requests; another digest run may have beaten us to them
+            claimed = BorrowRequest.query.filter(
+                BorrowRequest.id.in_(request_ids),
+                BorrowRequest.owner_notified_at.is_(None)
+            ).update({'owner_notified_at': now}, synchronize_session=False)
+            if claimed != len(request_ids):
+                db.session.rollback()
+                continue
+
+            subject, body = build_digest_email(owner, requests)
+            enqueue_email(owner.email, subject, body)
+            owner.last_digest_sent_at = now
+            db.session.commit()
+            queued += 1
+
+        if queued:
+            logging.info("Queued %s notification digests", queued)
+            wake_outbox()
+        return queued
+    except Exception as e:
+        logging.error("Error sending notification digests: %s", e)
+        db.session.rollback()
+        raise
+
+
+def start_digest_scheduler(app):
+    """Check for due digests every DIGEST_CHECK_INTERVAL seconds (0 disables)"""
+    return start_periodic_job(
+        app, 'notification-digests', app.config.get('DIGEST_CHECK_INTERVAL', 0), send_due_digests
+    )
@@ -2,34 +2,55 @@ import os
 import smtplib
 import logging
 import ssl
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def send_borrow_request_email(to_email, from_user_name, book_title, message, from_user_email=None):
-    """Send borrow request email using Gmail SMTP with enhanced PythonAnywhere compatibility"""
-    try:
-        # Gmail SMTP configuration
-        smtp_server = "smtp.gmail.com"
-        gmail_email = os.environ.get('GMAIL_EMAIL')
-        gmail_password = os.environ.get('GMAIL_APP_PASSWORD')
-
-        if not gmail_email or not gmail_password:
-            logger.error("Gmail credentials not configured. Set GMAIL_EMAIL and GMAIL_APP_PASSWORD")
-            logger.error("Note: Use Gmail App Password (16 characters), not regular password")
-            return False
-
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = gmail_email
-        msg['To'] = to_email
-        msg['Subject'] = f"📚 BorrowBee: Book Borrow Request for '{book_title}'"
-
-        # Email body
-        body = f"""
+class EmailDeliveryError(Exception):
+    """Raised when a message could not be handed to any SMTP server"""
+
+def get_smtp_configs():
+    """SMTP connection attempts in order of preference.
+
+    Defaults to Gmail (STARTTLS on 587, then SSL on 465). Setting SMTP_HOST
+    points delivery at a single other server instead, e.g. a local stand-in
+    with SMTP_HOST=localhost SMTP_PORT=1025 SMTP_STARTTLS=0.
+    """
+    smtp_host = os.environ.get('SMTP_HOST')
+    if smtp_host:
+        use_ssl = os.environ.get('SMTP_USE_SSL', '0') == '1'
+        starttls = not use_ssl and os.environ.get('SMTP_STARTTLS', '1') == '1'
+        return [{
+            'server': smtp_host,
+            'port': int(os.environ.get('SMTP_PORT', 465 if use_ssl else 587)),
+            'use_ssl': use_ssl,
+            'starttls': starttls,
+            'method': 'SSL' if use_ssl else 'STARTTLS' if starttls else 'PLAIN'
+        }]
+    return [
+        {'server': 'smtp.gmail.com', 'port': 587, 'use_ssl': False, 'starttls': True, 'method': 'STARTTLS'},
+        {'server': 'smtp.gmail.com', 'port': 465, 'use_ssl': True, 'starttls': False, 'method': 'SSL'}
+    ]
+
+def get_smtp_credentials():
+    """(username, password) for SMTP AUTH, or (None, None) if not configured"""
+    return os.environ.get('GMAIL_EMAIL'), os.environ.get('GMAIL_APP_PASSWORD')
+
+def get_sender_address():
+    """From address for outgoing mail"""
+    return os.environ.get('MAIL_FROM') or os.environ.get('GMAIL_EMAIL')
+
+def smtp_timeout():
+    """Seconds to wait on the SMTP server before giving up"""
+    return float(os.environ.get('SMTP_TIMEOUT', 30))
+
+def build_borrow_request_email(from_user_name, book_title, message, from_user_email=None):
+    """Subject and body of a borrow request notification"""
+    subject = f"📚 BorrowBee: Book Borrow Request for '{book_title}'"
+    body = f"""
 Hello!
 
 You have received a new book borrow request through BorrowBee:
@@ -48,42 +69,239 @@ Best regards,
 BorrowBee Team
 🍯 Your Digital Library Community
         """
+    return subject, body
 
-        msg.attach(MIMEText(body, 'plain'))
-
-        # Try multiple SMTP configurations for better PythonAnywhere compatibility
-        smtp_configs = [
-            {'port': 587, 'use_ssl': False, 'method': 'STARTTLS'},
-            {'port': 465, 'use_ssl': True, 'method': 'SSL'}
-        ]
+def build_notification_email(subject, message):
+    """Subject and body of a general notification"""
+    body = f"""
+{message}
 
-        for config in smtp_configs:
+---
+Best regards,
+BorrowBee Team
+🍯 Your Digital Library Community
+        """
+    return f"🍯 BorrowBee: {subject}", body
+
+def create_message(to_email, subject, body):
+    """MIME message ready to send"""
+    msg = MIMEMultipart()
+    msg['From'] = get_sender_address()
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+def open_smtp_connection(config):
+    """Connect, secure and authenticate an SMTP session for one config"""
+    if config['use_ssl']:
+        context = ssl.create_default_context()
+        server = smtplib.SMTP_SSL(config['server'], config['port'], context=context, timeout=smtp_timeout())
+    else:
+        server = smtplib.SMTP(config['server'], config['port'], timeout=smtp_timeout())
+        if config['starttls']:
+            server.starttls()
+
+    username, password = get_smtp_credentials()
+    if username and password:
+        server.login(username, password)
+    return server
+
+def connect_smtp():
+    """Open an authenticated session with the first SMTP config that works"""
+    last_error = None
+    for config in get_smtp_configs():
+        try:
+            server = open_smtp_connection(config)
+            logger.info("Opened SMTP session via %s", config['method'])
+            return server
+        except Exception as method_error:
+            logger.warning("%s method failed: %s", config['method'], method_error)
+            last_error = method_error
+    raise EmailDeliveryError(f"All SMTP methods failed: {last_error}")
+
+class PooledSMTPConnection:
+    """An SMTP session checked out of the pool, with its usage counters"""
+
+    def __init__(self, server):
+        self.server = server
+        self.last_used = time.monotonic()
+        self.messages_sent = 0
+
+    def send(self, msg):
+        self.server.send_message(msg)
+        self.messages_sent += 1
+
+    def close(self):
+        try:
+            self.server.quit()
+        except Exception:
             try:
-                if config['use_ssl']:
-                    # SSL connection (port 465)
-                    context = ssl.create_default_context()
-                    server = smtplib.SMTP_SSL(smtp_server, config['port'], context=context)
-                else:
-                    # STARTTLS connection (port 587)
-                    server = smtplib.SMTP(smtp_server, config['port'])
-                    server.starttls()
-
-                server.login(gmail_email, gmail_password)
-                server.send_message(msg)
-                server.quit()
-
-                logger.info(f"Borrow request email sent successfully to {to_email} via {config['method']}")
-                return True
-
-            except Exception as method_error:
-                logger.warning(f"{config['method']} method failed: {method_error}")
+                self.server.close()
+            except Exception:
+                pass
+
+class SMTPConnectionPool:
+    """Keeps authenticated SMTP sessions alive so messages skip the handshake.
+
+    Idle sessions are health-checked with NOOP before reuse once they have
+    sat for more than `check_after` seconds, dropped after `idle_timeout`,
+    and recycled after `max_messages` sends.
+    """
+
+    def __init__(self, max_idle=4, idle_timeout=60, check_after=5, max_messages=100):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.max_messages = max_messages
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Check out a live session, reconnecting if none can be reused"""
+        while True:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+            if pooled is None:
+                return PooledSMTPConnection(connect_smtp())
+
+            idle_for = time.monotonic() - pooled.last_used
+            if idle_for > self.idle_timeout:
+                pooled.close()
                 continue
+            if idle_for > self.check_after and not self._is_alive(pooled):
+                pooled.close()
+                continue
+            return pooled
+
+    def release(self, pooled, broken=False):
+        """Return a session to the pool, or close it if it can't be reused"""
+        if broken or pooled.messages_sent >= self.max_messages:
+            pooled.close()
+            return
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(pooled)
+                return
+        pooled.close()
+
+    def close_all(self):
+        """Close every idle session"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            pooled.close()
+
+    @staticmethod
+    def _is_alive(pooled):
+        try:
+            return pooled.server.noop()[0] == 250
+        except Exception:
+            return False
 
-        logger.error("All SMTP methods failed. Check Gmail App Password and 2FA settings")
-        return False
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_smtp_pool():
+    """Process-wide SMTP connection pool, created on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SMTPConnectionPool(
+                    max_idle=int(os.environ.get('SMTP_POOL_SIZE', 4)),
+                    idle_timeout=float(os.environ.get('SMTP_POOL_IDLE_TIMEOUT', 60)),
+                    check_after=float(os.environ.get('SMTP_POOL_CHECK_AFTER', 5)),
+                    max_messages=int(os.environ.get('SMTP_MAX_MESSAGES_PER_CONNECTION', 100))
+                )
+    return _pool
+
+def close_smtp_pool():
+    """Close pooled SMTP sessions, e.g. at shutdown"""
+    if _pool is not None:
+        _pool.close_all()
+
+def check_email_configured():
+    """Raise EmailDeliveryError if there is no sender or no SMTP credentials"""
+    if not get_sender_address():
+        raise EmailDeliveryError("Sender not configured. Set GMAIL_EMAIL (or MAIL_FROM)")
+    if not os.environ.get('SMTP_HOST') and not all(get_smtp_credentials()):
+        raise EmailDeliveryError("Gmail credentials not configured. Set GMAIL_EMAIL and GMAIL_APP_PASSWORD")
+
+def send_batch(messages):
+    """Send (to_email, subject, body) messages over one pooled SMTP session.
+
+    A session that drops mid-batch is replaced and the message retried once.
+    Returns one {'to_email', 'success', 'error'} dict per message, in order.
+    """
+    check_email_configured()
+    pool = get_smtp_pool()
+    results = []
+    pooled = None
+
+    try:
+        for index, (to_email, subject, body) in enumerate(messages):
+            msg = create_message(to_email, subject, body)
+            error = None
+
+            for attempt in range(2):
+                try:
+                    if pooled is None:
+                        pooled = pool.acquire()
+                    pooled.send(msg)
+                    error = None
+                    break
+                except EmailDeliveryError as e:
+                    # Could not connect at all; fail the rest of the batch
+                    results.extend(
+                        {'to_email': pending[0], 'success': False, 'error': str(e)}
+                        for pending in messages[index:]
+                    )
+                    return results
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                    # Rejected by the server; the session itself is still usable
+                    error = e
+                    break
+                except (smtplib.SMTPServerDisconnected, OSError) as e:
+                    if pooled is not None:
+                        pool.release(pooled, broken=True)
+                        pooled = None
+                    error = e
+
+            if error is None:
+                logger.info("Email sent successfully to %s", to_email)
+            else:
+                logger.warning("Email to %s failed: %s", to_email, error)
+            results.append({
+                'to_email': to_email,
+                'success': error is None,
+                'error': str(error) if error is not None else None
+            })
+    finally:
+        if pooled is not None:
+            pool.release(pooled)
+
+    return results
+
+def send_email(to_email, subject, body):
+    """Send one message over a pooled SMTP session.
+
+    Raises EmailDeliveryError if the message could not be delivered.
+    """
+    result = send_batch([(to_email, subject, body)])[0]
+    if not result['success']:
+        raise EmailDeliveryError(result['error'])
+    return True
+
+def send_borrow_request_email(to_email, from_user_name, book_title, message, from_user_email=None):
+    """Send borrow request email using Gmail SMTP with enhanced PythonAnywhere compatibility"""
+    try:
+        subject, body = build_borrow_request_email(from_user_name, book_title, message, from_user_email)
+        return send_email(to_email, subject, body)
 
     except Exception as e:
-        logger.error(f"Failed to send borrow request email: {e}")
+        logger.error("Failed to send borrow request email: %s", e)
         logger.error("Troubleshooting tips:")
         logger.error("1. Ensure 2-Factor Authentication is enabled on Gmail")
         logger.error("2. Use App Password (16 characters) instead of regular password")
@@ -93,90 +311,30 @@ BorrowBee Team
 def send_notification_email(to_email, subject, message):
     """Send general notification email with enhanced PythonAnywhere compatibility"""
     try:
-        smtp_server = "smtp.gmail.com"
-        gmail_email = os.environ.get('GMAIL_EMAIL')
-        gmail_password = os.environ.get('GMAIL_APP_PASSWORD')
-
-        if not gmail_email or not gmail_password:
-            logger.error("Gmail credentials not configured")
-            return False
-
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = gmail_email
-        msg['To'] = to_email
-        msg['Subject'] = f"🍯 BorrowBee: {subject}"
-
-        body = f"""
-{message}
-
----
-Best regards,
-BorrowBee Team
-🍯 Your Digital Library Community
-        """
-
-        msg.attach(MIMEText(body, 'plain'))
-
-        # Try multiple SMTP configurations
-        smtp_configs = [
-            {'port': 587, 'use_ssl': False, 'method': 'STARTTLS'},
-            {'port': 465, 'use_ssl': True, 'method': 'SSL'}
-        ]
-
-        for config in smtp_configs:
-            try:
-                if config['use_ssl']:
-                    context = ssl.create_default_context()
-                    server = smtplib.SMTP_SSL(smtp_server, config['port'], context=context)
-                else:
-                    server = smtplib.SMTP(smtp_server, config['port'])
-                    server.starttls()
-
-                server.login(gmail_email, gmail_password)
-                server.send_message(msg)
-                server.quit()
-
-                logger.info(f"Notification email sent successfully to {to_email} via {config['method']}")
-                return True
-
-            except Exception as method_error:
-                logger.warning(f"{config['method']} method failed: {method_error}")
-                continue
-
-        logger.error("All SMTP methods failed for notification email")
-        return False
+        subject, body = build_notification_email(subject, message)
+        return send_email(to_email, subject, body)
 
     except Exception as e:
-        logger.error(f"Failed to send notification email: {e}")
+        logger.error("Failed to send notification email: %s", e)
         return False
 
 def test_email_configuration():
-    """Test Gmail SMTP configuration"""
-    gmail_email = os.environ.get('GMAIL_EMAIL')
-    gmail_password = os.environ.get('GMAIL_APP_PASSWORD')
+    """Test SMTP configuration"""
+    gmail_email, gmail_password = get_smtp_credentials()
 
-    if not gmail_email or not gmail_password:
+    if not os.environ.get('SMTP_HOST') and (not gmail_email or not gmail_password):
         logger.error("Gmail credentials missing")
         return False, "Missing GMAIL_EMAIL or GMAIL_APP_PASSWORD environment variables"
 
-    try:
-        # Test STARTTLS
-        server = smtplib.SMTP("smtp.gmail.com", 587)
-        server.starttls()
-        server.login(gmail_email, gmail_password)
-        server.quit()
-        logger.info("Gmail SMTP test successful")
-        return True, "Gmail SMTP configuration working"
-    except Exception as e:
+    errors = []
+    for config in get_smtp_configs():
         try:
-            # Test SSL
-            context = ssl.create_default_context()
-            server = smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context)
-            server.login(gmail_email, gmail_password)
+            server = open_smtp_connection(config)
             server.quit()
-            logger.info("Gmail SMTP SSL test successful")
-            return True, "Gmail SMTP SSL configuration working"
-        except Exception as ssl_error:
-            logger.error(f"Both SMTP methods failed: STARTTLS: {e}, SSL: {ssl_error}")
-            return False, f"SMTP test failed: {e}"
\ No newline at end of file
+            logger.info("SMTP %s test successful", config['method'])
+            return True, f"SMTP {config['method']} configuration working"
+        except Exception as e:
+            errors.append(f"{config['method']}: {e}")
+
+    logger.error("All SMTP methods failed: %s", ', '.join(errors))
+    return False, f"SMTP test failed: {errors[0]}"
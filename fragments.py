@@ -0,0 +1,44 @@
+from flask import current_app
+from markupsafe import Markup
+from response_cache import InProcessResponseCache
+from images import cover_urls
+from assets import asset_url
+import threading
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_fragment_store():
+    """Process-wide LRU of rendered template fragments, created on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = InProcessResponseCache(current_app.config.get('FRAGMENT_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+    return _store
+
+
+def cache_fragment(name, *key_parts, caller):
+    """Render the body of a {% call %} block once per name and key.
+
+    Keys should include everything the block shows, e.g. the book id and
+    updated_at, so changed books simply miss; per-user markup belongs outside
+    the block. Stale entries age out of the LRU.
+    """
+    if not current_app.config.get('FRAGMENT_CACHE_MAX_BYTES'):
+        return caller()
+    store = get_fragment_store()
+    key = f"{name}:{'|'.join(str(part) for part in key_parts)}"
+    html = store.get(key)
+    if html is None:
+        html = str(caller())
+        store.set(key, html, current_app.config.get('FRAGMENT_CACHE_TTL', 3600))
+    return Markup(html)
+
+
+def register_template_helpers(app):
+    """Expose fragment caching, cover image and asset URLs to templates"""
+    app.add_template_global(cache_fragment)
+    app.add_template_global(cover_urls)
+    app.add_template_global(asset_url)
@@ -0,0 +1,81 @@
+from flask import current_app, g, session
+from sqlalchemy.orm import make_transient_to_detached
+from app import db
+from models import User
+from collections import OrderedDict
+import threading
+import time
+
+# User columns kept in the identity cache; counters and the password hash
+# are left out and load from the database if a page touches them
+IDENTITY_FIELDS = (
+    'id', 'username', 'email', 'is_admin', 'first_name', 'last_name', 'bio', 'location',
+    'notification_mode', 'digest_interval_minutes', 'created_at', 'updated_at'
+)
+
+
+class IdentityCache:
+    """Short-lived per-process copies of users' identity columns"""
+
+    def __init__(self, max_entries=10_000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            values, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return values
+
+    def set(self, user_id, values, ttl):
+        with self._lock:
+            self._entries[user_id] = (values, time.monotonic() + ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+_cache = IdentityCache()
+
+
+def load_user(user_id):
+    """A session-attached User, built from the identity cache when it's warm.
+
+    A cache hit is merged into the session without a query, so the user can
+    still be modified and committed; uncached columns load on first access.
+    """
+    ttl = current_app.config.get('IDENTITY_CACHE_TTL', 0)
+    values = _cache.get(user_id) if ttl else None
+    if values is not None:
+        user = User(**values)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    user = db.session.get(User, user_id)
+    if user and ttl:
+        _cache.set(user_id, {name: getattr(user, name) for name in IDENTITY_FIELDS}, ttl)
+    return user
+
+
+def invalidate_identity(user_id):
+    """Drop a user's cached identity after their profile or role changes"""
+    _cache.invalidate(user_id)
+
+
+def current_user():
+    """The logged-in User for this request, or None, loaded at most once"""
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = load_user(user_id) if user_id else None
+    return g.current_user
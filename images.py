@@ -0,0 +1,175 @@
+from flask import current_app, url_for
+from app import db
+from models import Book
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+import hashlib
+import io
+import logging
+import os
+import threading
+
+# Fixed (width, height) renditions, 3:4 like the cover frames in the templates
+COVER_SIZES = {
+    'card': (240, 320),
+    'detail': (600, 800),
+}
+# Renditions per size: (extension, Pillow format, save options)
+COVER_FORMATS = [
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+]
+# Refuse images that would decode to more pixels than this (decompression bombs)
+MAX_IMAGE_PIXELS = 40_000_000
+# Upload formats we decode; anything else (EPS via Ghostscript, PSD, ...) is rejected
+UPLOAD_FORMATS = ['JPEG', 'PNG', 'WEBP', 'GIF']
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ImageProcessingError(ValueError):
+    """Raised when an upload is not an image we can decode"""
+
+
+def cover_folder():
+    """Directory holding content-addressed cover renditions"""
+    return os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'], 'covers')
+
+
+def cover_filename(digest, size, extension):
+    """Path of one rendition relative to cover_folder(), sharded by hash prefix"""
+    return f"{digest[:2]}/{digest}-{size}.{extension}"
+
+
+def get_image_executor():
+    """Process-wide pool that decodes and resizes uploads off the request thread"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('IMAGE_WORKERS', 2),
+                    thread_name_prefix='cover-images'
+                )
+    return _executor
+
+
+def render_cover(data, folder, digest):
+    """Decode an image and write every size/format rendition for it"""
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    try:
+        with Image.open(io.BytesIO(data), formats=UPLOAD_FORMATS) as image:
+            # Pillow itself only raises at twice its limit, so check the header size here
+            if image.width * image.height > MAX_IMAGE_PIXELS:
+                raise ImageProcessingError(f"Image too large: {image.width}x{image.height}")
+            image.verify()
+        with Image.open(io.BytesIO(data), formats=UPLOAD_FORMATS) as image:
+            image = ImageOps.exif_transpose(image)
+            image = image.convert('RGB')
+            for size, dimensions in COVER_SIZES.items():
+                rendition = ImageOps.fit(image, dimensions, Image.Resampling.LANCZOS)
+                for extension, image_format, options in COVER_FORMATS:
+                    path = os.path.join(folder, cover_filename(digest, size, extension))
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    # Write then rename so a half-written file is never served
+                    temp_path = f"{path}.{threading.get_ident()}.tmp"
+                    rendition.save(temp_path, image_format, **options)
+                    os.replace(temp_path, path)
+    except (Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise ImageProcessingError(f"Could not process image: {e}")
+
+
+def store_cover(data):
+    """Store an uploaded cover under its content hash and return the hash.
+
+    Identical uploads share one set of renditions, so a repeat upload skips
+    decoding entirely. Raises ImageProcessingError for non-images.
+    """
+    if not data:
+        raise ImageProcessingError("Empty upload")
+    digest = hashlib.sha256(data).hexdigest()
+    folder = cover_folder()
+    last_rendition = os.path.join(folder, cover_filename(digest, list(COVER_SIZES)[-1], COVER_FORMATS[-1][0]))
+    if not os.path.exists(last_rendition):
+        get_image_executor().submit(render_cover, data, folder, digest).result()
+    return digest
+
+
+def store_cover_upload(file_storage):
+    """Store a cover from a form upload, or return None if no file was sent"""
+    if not file_storage or not file_storage.filename:
+        return None
+    return store_cover(file_storage.read())
+
+
+def fetch_cover(source, max_bytes=16 * 1024 * 1024, timeout=15):
+    """Bytes of an existing cover, from an http(s) URL or a legacy upload file"""
+    if source.startswith(('http://', 'https://')):
+        with urlopen(Request(source, headers={'User-Agent': 'BorrowBee'}), timeout=timeout) as response:
+            data = response.read(max_bytes + 1)
+    else:
+        path = os.path.join(current_app.root_path, 'static', 'uploads', os.path.basename(source))
+        with open(path, 'rb') as legacy_file:
+            data = legacy_file.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ImageProcessingError(f"Cover larger than {max_bytes} bytes")
+    return data
+
+
+def cover_urls(book, size='card'):
+    """{'webp', 'jpeg'} URLs for a book's cover at a given size.
+
+    Books with a stored cover get their resized renditions; older books fall
+    back to their cover_image URL (or legacy static/uploads file) with no
+    WebP variant. Works on Book objects and the dashboard's book dicts.
+    """
+    field = book.get if isinstance(book, dict) else lambda name: getattr(book, name, None)
+    digest = field('cover_hash')
+    if digest:
+        return {
+            'webp': url_for('main.cover_file', filename=cover_filename(digest, size, 'webp')),
+            'jpeg': url_for('main.cover_file', filename=cover_filename(digest, size, 'jpg'))
+        }
+    cover_image = field('cover_image')
+    if not cover_image:
+        return None
+    if '/' not in cover_image:
+        cover_image = url_for('static', filename='uploads/' + cover_image)
+    return {'webp': None, 'jpeg': cover_image}
+
+
+def import_existing_covers(batch_size=100):
+    """Run covers stored as URLs or legacy files through the pipeline"""
+    imported = failed = 0
+    last_id = 0
+    while True:
+        books = Book.query.filter(
+            Book.id > last_id,
+            Book.cover_hash.is_(None),
+            Book.cover_image.isnot(None),
+            Book.cover_image != ''
+        ).order_by(Book.id).limit(batch_size).all()
+        if not books:
+            break
+        for book in books:
+            last_id = book.id
+            try:
+                book.cover_hash = store_cover(fetch_cover(book.cover_image))
+                imported += 1
+            except Exception as e:
+                logging.warning("Could not import cover for book %s: %s", book.id, e)
+                failed += 1
+        db.session.commit()
+    return imported, failed
+
+
+def cover_from_upload(file_storage):
+    """(cover hash, error message) for an optional cover file in a form post"""
+    try:
+        return store_cover_upload(file_storage), None
+    except ImageProcessingError as e:
+        logging.warning("Rejected cover upload: %s", e)
+        return None, 'Cover image could not be processed. Please upload a JPEG, PNG, WebP or GIF image.'
@@ -0,0 +1,134 @@
+from flask import current_app, g, has_request_context, request
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime, timezone
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+
+# Client-supplied request IDs are reused only if they look like IDs
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_listener = None
+_queue_handler = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the request ID while still on the request thread"""
+
+    def filter(self, record):
+        record.request_id = g.get('request_id', '-') if has_request_context() else '-'
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a random share of INFO and DEBUG records logged with extra=sampled()"""
+
+    def filter(self, record):
+        rate = getattr(record, 'sample_rate', None)
+        return rate is None or record.levelno > logging.INFO or random.random() < rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, request_id and message"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def sampled(rate=None):
+    """`extra` for a high-volume info event, kept with LOG_SAMPLE_RATE probability"""
+    return {'sample_rate': current_app.config.get('LOG_SAMPLE_RATE', 1.0) if rate is None else rate}
+
+
+def _start_listener(output_handler, log_queue):
+    """Start the thread that writes queued records to the real handler"""
+    global _listener
+    _listener = QueueListener(log_queue, output_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_listener_in_child(output_handler, maxsize):
+    """Give a forked worker its own queue and listener thread.
+
+    The parent's listener may have held the inherited queue's locks at fork
+    time, leaving them locked forever in the child, so it is never reused.
+    """
+    log_queue = queue.Queue(maxsize=maxsize)
+    _queue_handler.queue = log_queue
+    _start_listener(output_handler, log_queue)
+
+
+def configure_logging(app):
+    """Send root logging through a queue so handler I/O runs off request threads.
+
+    Records are filtered (sampling) and stamped with the request ID on the
+    calling thread, then formatted and written by a single listener thread.
+    LOG_LEVEL and LOG_FORMAT (json or text) pick level and output.
+    """
+    global _queue_handler
+    root = logging.getLogger()
+    root.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+
+    if _queue_handler is None:
+        output_handler = logging.StreamHandler(sys.stderr)
+        if app.config.get('LOG_FORMAT', 'json') == 'json':
+            output_handler.setFormatter(JsonFormatter())
+        else:
+            output_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'))
+
+        maxsize = app.config.get('LOG_QUEUE_SIZE', 10000)
+        log_queue = queue.Queue(maxsize=maxsize)
+        _queue_handler = DroppingQueueHandler(log_queue)
+        _queue_handler.addFilter(SamplingFilter())
+        _queue_handler.addFilter(RequestContextFilter())
+        root.handlers = [_queue_handler]
+
+        _start_listener(output_handler, log_queue)
+        atexit.register(lambda: _listener.stop())
+        # Threads don't survive fork; pre-forking servers need a listener per worker
+        os.register_at_fork(after_in_child=lambda: _restart_listener_in_child(output_handler, maxsize))
+
+    @app.before_request
+    def assign_request_id():
+        incoming = request.headers.get('X-Request-ID', '')
+        g.request_id = incoming if _REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        g.request_started_at = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+            elapsed_ms = (time.perf_counter() - g.request_started_at) * 1000
+            logging.getLogger('borrowbee.requests').info(
+                "%s %s %s %.1fms", request.method, request.path, response.status_code, elapsed_ms,
+                extra=sampled(app.config.get('LOG_REQUEST_SAMPLE_RATE'))
+            )
+        return response
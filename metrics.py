@@ -0,0 +1,160 @@
+from flask import Response, abort, before_render_template, current_app, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import bisect
+import logging
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+logger = logging.getLogger('borrowbee.sql')
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus text format, kept in this process"""
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+            series = [(labels, list(counts), total) for labels, (counts, total) in series]
+        for labels, counts, total in series:
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{label_text}{"," if label_text else ""}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_SECONDS = Histogram(
+    'borrowbee_request_duration_seconds', 'Wall time of each request.',
+    ('endpoint', 'method', 'status'), LATENCY_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    'borrowbee_request_sql_queries', 'SQL statements executed per request.',
+    ('endpoint',), QUERY_COUNT_BUCKETS
+)
+REQUEST_SQL_SECONDS = Histogram(
+    'borrowbee_request_sql_seconds', 'Cumulative SQL time per request.',
+    ('endpoint',), LATENCY_BUCKETS
+)
+REQUEST_RENDER_SECONDS = Histogram(
+    'borrowbee_request_template_seconds', 'Cumulative template render time per request.',
+    ('endpoint',), LATENCY_BUCKETS
+)
+HISTOGRAMS = (REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_SQL_SECONDS, REQUEST_RENDER_SECONDS)
+
+
+def redacted_parameters(parameters):
+    """Parameter types only, so slow-query logs never carry user data"""
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            return f"<{len(parameters)} parameter sets>"
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_started_at', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _finish_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('statement_started_at')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if not has_request_context():
+        return
+    if 'sql_queries' in g:
+        g.sql_queries += 1
+        g.sql_seconds += elapsed
+    threshold_ms = current_app.config.get('SLOW_QUERY_MS', 0)
+    if threshold_ms and elapsed * 1000 >= threshold_ms:
+        logger.warning("Slow query (%.1fms) in %s: %s params=%s", elapsed * 1000, request.endpoint,
+                       ' '.join(statement.split()), redacted_parameters(parameters))
+
+
+def _start_render(sender, template, context, **extra):
+    if 'render_seconds' in g:
+        g.setdefault('render_started_at', []).append(time.perf_counter())
+
+
+def _finish_render(sender, template, context, **extra):
+    if g.get('render_started_at'):
+        g.render_seconds += time.perf_counter() - g.render_started_at.pop()
+
+
+def render_metrics():
+    """Every histogram in the Prometheus text exposition format"""
+    return '\n'.join(histogram.render() for histogram in HISTOGRAMS) + '\n'
+
+
+def init_metrics(app):
+    """Record per-request latency, SQL and template timings and serve /metrics.
+
+    Histograms live in this process; with several workers, scrape each one
+    or run a single worker per metrics port. /metrics exists only when
+    METRICS_TOKEN is set, and requires it as a bearer token.
+    """
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    before_render_template.connect(_start_render, app)
+    template_rendered.connect(_finish_render, app)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started_at = time.perf_counter()
+        g.sql_queries = 0
+        g.sql_seconds = 0.0
+        g.render_seconds = 0.0
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'metrics_started_at' in g and request.endpoint != 'metrics':
+            endpoint = request.endpoint or 'unmatched'
+            REQUEST_SECONDS.observe(time.perf_counter() - g.metrics_started_at, endpoint, request.method, str(response.status_code))
+            REQUEST_QUERIES.observe(g.sql_queries, endpoint)
+            REQUEST_SQL_SECONDS.observe(g.sql_seconds, endpoint)
+            REQUEST_RENDER_SECONDS.observe(g.render_seconds, endpoint)
+        return response
+
+    token = app.config.get('METRICS_TOKEN')
+    if not token:
+        return
+
+    def metrics():
+        if request.headers.get('Authorization') != f"Bearer {token}":
+            abort(401)
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
@@ -13,6 +13,11 @@ class User(db.Model):
     last_name = db.Column(db.String(255))
     bio = db.Column(db.Text)
     location = db.Column(db.String(500))
+    notification_mode = db.Column(db.String(20), default='immediate')  # immediate, digest
+    digest_interval_minutes = db.Column(db.Integer, default=15)
+    last_digest_sent_at = db.Column(db.DateTime)
+    pending_request_count = db.Column(db.Integer, default=0)  # pending borrow requests for this user's books
+    is_admin = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -29,6 +34,16 @@ class User(db.Model):
 
 class Book(db.Model):
     __tablename__ = 'books'
+    __table_args__ = (
+        # Supports newest-first keyset pagination on (created_at, id)
+        db.Index('ix_books_created_at_id', 'created_at', 'id'),
+        # Supports "listed and not expired" filters and ending-soon ordering
+        db.Index('ix_books_active_available_expires', 'active', 'available', 'availability_expires_at'),
+        # Supports newest-first listings of listed books
+        db.Index('ix_books_active_available_created_at', 'active', 'available', 'created_at', 'id'),
+        # Supports the owner's book list on the dashboard
+        db.Index('ix_books_user_id_active_created_at', 'user_id', 'active', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False)
@@ -36,8 +51,10 @@ class Book(db.Model):
     description = db.Column(db.Text)
     category = db.Column(db.String(100))
     cover_image = db.Column(db.Text)
+    cover_hash = db.Column(db.String(64))  # content hash of uploaded cover renditions
     availability_period = db.Column(db.String(50))
     availability_start_date = db.Column(db.DateTime)
+    availability_expires_at = db.Column(db.DateTime)
     available = db.Column(db.Boolean, default=True)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -54,6 +71,12 @@ class Book(db.Model):
 
 class Review(db.Model):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        # Per-book rating lookups, and a user's rating of a given book
+        db.Index('ix_reviews_book_id_user_id', 'book_id', 'user_id'),
+        # A user's ratings across a page of books
+        db.Index('ix_reviews_user_id_book_id', 'user_id', 'book_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
@@ -67,14 +90,74 @@ class Review(db.Model):
 
 class BorrowRequest(db.Model):
     __tablename__ = 'borrow_requests'
+    __table_args__ = (
+        # At most one pending/approved request per (book, user); NULL flags
+        # on rejected requests never conflict
+        db.Index('uq_borrow_requests_active', 'book_id', 'user_id', 'active_flag', unique=True),
+        # Existing-request checks by status
+        db.Index('ix_borrow_requests_book_user_status', 'book_id', 'user_id', 'status'),
+        # A borrower's requests on the dashboard, newest first
+        db.Index('ix_borrow_requests_user_id_created_at', 'user_id', 'created_at'),
+        # Pending requests awaiting an owner digest
+        db.Index('ix_borrow_requests_status_notified', 'status', 'owner_notified_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     message = db.Column(db.Text)
     status = db.Column(db.String(50), default='pending')  # pending, approved, rejected
+    owner_notified_at = db.Column(db.DateTime)
+    active_flag = db.Column(db.Integer, db.Computed("CASE WHEN status IN ('pending', 'approved') THEN 1 END"))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def __repr__(self):
-        return f'<BorrowRequest {self.id}>'
\ No newline at end of file
+        return f'<BorrowRequest {self.id}>'
+
+class RatingSummary(db.Model):
+    __tablename__ = 'rating_summaries'
+    
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), primary_key=True)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    stars_1 = db.Column(db.Integer, nullable=False, default=0)
+    stars_2 = db.Column(db.Integer, nullable=False, default=0)
+    stars_3 = db.Column(db.Integer, nullable=False, default=0)
+    stars_4 = db.Column(db.Integer, nullable=False, default=0)
+    stars_5 = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @property
+    def average_rating(self):
+        """Average star rating, 0 when the book has no ratings"""
+        return self.rating_sum / self.rating_count if self.rating_count else 0
+    
+    def histogram(self):
+        """Rating counts for 1 to 5 stars"""
+        return [self.stars_1, self.stars_2, self.stars_3, self.stars_4, self.stars_5]
+    
+    def __repr__(self):
+        return f'<RatingSummary {self.book_id}>'
+
+
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(500), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} {self.status}>'
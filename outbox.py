@@ -0,0 +1,194 @@
+from app import db
+from models import EmailOutbox
+from email_service import send_email
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+import logging
+import random
+import threading
+
+# Statuses a message can be claimed from; 'sending' rows are reclaimed once
+# their lease (next_attempt_at) runs out, e.g. after a worker crashed
+CLAIMABLE_STATUSES = ('pending', 'sending')
+
+_dispatcher_lock = threading.Lock()
+_dispatcher_thread = None
+_wake_event = threading.Event()
+
+
+def enqueue_email(to_email, subject, body):
+    """Add a message to the outbox in the caller's transaction (no commit)"""
+    entry = EmailOutbox(
+        to_email=to_email,
+        subject=subject,
+        body=body,
+        status='pending',
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(entry)
+    return entry
+
+
+def wake_outbox():
+    """Ask the in-process dispatcher to look for new mail right away"""
+    _wake_event.set()
+
+
+def retry_delay(app, attempts):
+    """Exponential backoff with jitter before retry number `attempts`"""
+    base = app.config.get('EMAIL_RETRY_BASE_DELAY', 60)
+    delay = base * (2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_due_emails(app, limit):
+    """Lease up to `limit` due messages to this worker and return their ids.
+
+    Each row is claimed with a conditional UPDATE so concurrent workers (or
+    processes) never deliver the same message twice while its lease holds.
+    """
+    now = datetime.utcnow()
+    lease_until = now + timedelta(seconds=app.config.get('EMAIL_SEND_LEASE', 300))
+    try:
+        candidate_ids = [row[0] for row in db.session.query(EmailOutbox.id).filter(
+            EmailOutbox.status.in_(CLAIMABLE_STATUSES),
+            EmailOutbox.next_attempt_at <= now
+        ).order_by(EmailOutbox.next_attempt_at).limit(limit).all()]
+
+        claimed = []
+        for entry_id in candidate_ids:
+            updated = EmailOutbox.query.filter(
+                EmailOutbox.id == entry_id,
+                EmailOutbox.status.in_(CLAIMABLE_STATUSES),
+                EmailOutbox.next_attempt_at <= now
+            ).update({
+                'status': 'sending',
+                'next_attempt_at': lease_until
+            }, synchronize_session=False)
+            if updated:
+                claimed.append(entry_id)
+        db.session.commit()
+        return claimed
+    except Exception as e:
+        logging.error("Error claiming outbox emails: %s", e)
+        db.session.rollback()
+        return []
+
+
+def deliver_email(app, entry_id, sender=send_email):
+    """Send one claimed message and record success, retry or dead-letter"""
+    entry = db.session.get(EmailOutbox, entry_id)
+    if entry is None or entry.status != 'sending':
+        return False
+
+    try:
+        sender(entry.to_email, entry.subject, entry.body)
+        entry.status = 'sent'
+        entry.sent_at = datetime.utcnow()
+        entry.attempts = entry.attempts + 1
+        entry.last_error = None
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        entry = db.session.get(EmailOutbox, entry_id)
+        entry.attempts = entry.attempts + 1
+        entry.last_error = str(e)[:2000]
+        if entry.attempts >= app.config.get('EMAIL_MAX_ATTEMPTS', 6):
+            entry.status = 'dead'
+            logging.error("Email %s to %s dead-lettered after %s attempts: %s", entry_id, entry.to_email, entry.attempts, e)
+        else:
+            entry.status = 'pending'
+            entry.next_attempt_at = datetime.utcnow() + retry_delay(app, entry.attempts)
+            logging.warning("Email %s attempt %s failed, retrying at %s: %s", entry_id, entry.attempts, entry.next_attempt_at, e)
+        db.session.commit()
+        return False
+
+
+def _deliver_in_context(app, entry_id):
+    with app.app_context():
+        try:
+            return deliver_email(app, entry_id)
+        except Exception as e:
+            logging.error("Error delivering email %s: %s", entry_id, e)
+            return False
+
+
+def process_outbox(app, executor, batch_size=None):
+    """Claim one batch of due messages, deliver them on the pool and wait.
+
+    Returns the number of messages claimed.
+    """
+    batch_size = batch_size or app.config.get('EMAIL_OUTBOX_BATCH_SIZE', 20)
+    with app.app_context():
+        entry_ids = claim_due_emails(app, batch_size)
+    if entry_ids:
+        wait([executor.submit(_deliver_in_context, app, entry_id) for entry_id in entry_ids])
+    return len(entry_ids)
+
+
+def run_outbox_worker(app, workers=None, once=False, stop_event=None):
+    """Drain the outbox with a thread pool until stopped (or once, if asked)"""
+    workers = workers or app.config.get('EMAIL_OUTBOX_WORKERS', 2) or 1
+    poll_interval = app.config.get('EMAIL_OUTBOX_POLL_INTERVAL', 30)
+    stop_event = stop_event or threading.Event()
+    delivered = 0
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='email-outbox') as executor:
+        while not stop_event.is_set():
+            try:
+                claimed = process_outbox(app, executor)
+            except Exception as e:
+                logging.error("Outbox worker error: %s", e)
+                claimed = 0
+            delivered += claimed
+            if claimed:
+                continue
+            if once:
+                break
+            _wake_event.wait(poll_interval)
+            _wake_event.clear()
+
+    return delivered
+
+
+def start_outbox_dispatcher(app):
+    """Start the in-process outbox worker pool once per process.
+
+    EMAIL_OUTBOX_WORKERS sets the pool size; 0 leaves delivery to the
+    standalone `flask outbox-worker` command.
+    """
+    global _dispatcher_thread
+    if not app.config.get('EMAIL_OUTBOX_WORKERS', 0) or _dispatcher_thread is not None:
+        return _dispatcher_thread
+    with _dispatcher_lock:
+        if _dispatcher_thread is None:
+            stop_event = threading.Event()
+            thread = threading.Thread(
+                target=run_outbox_worker,
+                args=(app,),
+                kwargs={'stop_event': stop_event},
+                name='email-outbox-dispatcher',
+                daemon=True
+            )
+            thread.stop_event = stop_event
+            thread.start()
+            _dispatcher_thread = thread
+    return _dispatcher_thread
+
+
+def requeue_dead_emails():
+    """Give dead-lettered messages a fresh set of attempts"""
+    try:
+        requeued = EmailOutbox.query.filter_by(status='dead').update({
+            'status': 'pending',
+            'attempts': 0,
+            'next_attempt_at': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        return requeued
+    except Exception as e:
+        logging.error("Error requeueing dead emails: %s", e)
+        db.session.rollback()
+        raise
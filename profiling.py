@@ -0,0 +1,147 @@
+from flask import g, request
+from itsdangerous import BadSignature, TimestampSigner
+from collections import Counter
+import cProfile
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_MODES = ('cprofile', 'stack')
+PROFILED_BLUEPRINTS = ('main', 'auth')
+
+logger = logging.getLogger('borrowbee.profiler')
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a timer into collapsed-stack counts"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def enable(self):
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump_stats(self, path):
+        """Write flamegraph.pl / speedscope collapsed-stack lines"""
+        with open(path, 'w') as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f"{stack} {count}\n")
+
+
+def _signer(app):
+    return TimestampSigner(app.secret_key, salt='borrowbee-profile')
+
+
+def profile_token(app, mode='cprofile'):
+    """Signed X-Profile header value that profiles requests in `mode`"""
+    return _signer(app).sign(mode).decode()
+
+
+def requested_mode(app):
+    """The profiling mode for this request, or None to run it unprofiled"""
+    token = request.headers.get(PROFILE_HEADER)
+    if token:
+        try:
+            mode = _signer(app).unsign(token, max_age=app.config.get('PROFILER_TOKEN_MAX_AGE', 3600)).decode()
+        except BadSignature:
+            logger.warning("Ignoring invalid %s header", PROFILE_HEADER)
+            return None
+        return mode if mode in PROFILE_MODES else None
+    rate = app.config.get('PROFILER_SAMPLE_RATE', 0)
+    if rate and random.random() < rate:
+        return app.config.get('PROFILER_MODE', 'cprofile')
+    return None
+
+
+def profile_folder(app):
+    return os.path.join(app.instance_path, app.config.get('PROFILER_DIR', 'profiles'))
+
+
+def write_profile(app, profiler, mode):
+    """Save a profile into the ring, dropping the oldest files past PROFILER_MAX_FILES"""
+    folder = profile_folder(app)
+    os.makedirs(folder, exist_ok=True)
+    extension = 'pstats' if mode == 'cprofile' else 'folded'
+    endpoint = (request.endpoint or 'unmatched').replace('.', '-')
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{endpoint}-{g.get('request_id', os.getpid())}.{extension}"
+    profiler.dump_stats(os.path.join(folder, name))
+
+    profiles = sorted(
+        (entry for entry in os.scandir(folder) if entry.name.endswith(('.pstats', '.folded'))),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in profiles[:max(0, len(profiles) - app.config.get('PROFILER_MAX_FILES', 50))]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+    return name
+
+
+def init_profiler(app):
+    """Profile main and auth requests on demand.
+
+    Disabled (the default), no hooks are installed at all. Enabled, a request
+    is profiled when it carries a valid signed X-Profile header (see
+    `flask profile-token`) or is picked at PROFILER_SAMPLE_RATE. Output goes
+    to instance/PROFILER_DIR: .pstats for cProfile, .folded collapsed stacks
+    for the sampler.
+    """
+    if not app.config.get('PROFILER_ENABLED'):
+        return
+
+    @app.before_request
+    def start_profiler():
+        if request.blueprint not in PROFILED_BLUEPRINTS:
+            return
+        mode = requested_mode(app)
+        if mode == 'cprofile':
+            g.profiler = cProfile.Profile()
+        elif mode == 'stack':
+            g.profiler = StackSampler(threading.get_ident(), app.config.get('PROFILER_INTERVAL_MS', 5) / 1000)
+        else:
+            return
+        g.profile_mode = mode
+        g.profiler.enable()
+
+    @app.after_request
+    def stop_profiler(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        try:
+            response.headers['X-Profile-File'] = write_profile(app, profiler, g.profile_mode)
+        except OSError as e:
+            logger.error("Could not write profile: %s", e)
+        return response
+
+    @app.teardown_request
+    def discard_profiler(exc):
+        # after_request is skipped when a view raises; don't leave profiling on
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
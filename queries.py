@@ -0,0 +1,163 @@
+from app import db
+from models import Book, RatingSummary, Review
+from search import apply_search
+from availability import listed_condition
+from flask_sqlalchemy.pagination import QueryPagination
+from datetime import datetime
+import base64
+import binascii
+
+
+def encode_cursor(book):
+    """Opaque cursor pointing just past a book in (created_at, id) order"""
+    if not book.created_at:
+        return None
+    raw = f"{book.created_at.isoformat()}|{book.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Turn a cursor back into (created_at, book_id), or None if it is invalid"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, book_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(book_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        return None
+
+
+def after_cursor(position):
+    """Keyset predicate for books that sort after position in newest-first order"""
+    created_at, book_id = position
+    return db.or_(
+        Book.created_at < created_at,
+        db.and_(Book.created_at == created_at, Book.id < book_id)
+    )
+
+
+class KeysetPagination(QueryPagination):
+    """Query pagination that seeks past a cursor instead of using OFFSET.
+
+    Pass ``cursor`` (from a previous page's ``next_cursor``) to jump straight
+    to the next page; without one it behaves like a normal OFFSET paginator.
+    The query must be ordered newest-first by (created_at, id).
+    """
+
+    def _query_items(self):
+        query = self._query_args['query']
+        position = decode_cursor(self._query_args.get('cursor'))
+        if position:
+            query = query.filter(after_cursor(position))
+        else:
+            query = query.offset(self._query_offset)
+        # Fetch one extra row to know whether a next page exists
+        items = query.limit(self.per_page + 1).all()
+        self._has_more = len(items) > self.per_page
+        return items[:self.per_page]
+
+    @property
+    def has_next(self):
+        return self._has_more
+
+    @property
+    def next_cursor(self):
+        """Cursor for the page after this one, or None on the last page"""
+        if not self._has_more or not self.items:
+            return None
+        last = self.items[-1]
+        return encode_cursor(last[0] if isinstance(last, tuple) else last)
+
+
+def paginate_books(query, rank=None, page=1, per_page=12, cursor=None, count=True):
+    """Paginate a Book query newest-first, by cursor when one is given.
+
+    Queries with a leading ``rank`` ordering (search relevance, ending soon)
+    can't seek by (created_at, id), so they fall back to OFFSET pagination
+    and never produce a cursor.
+    """
+    if rank is not None:
+        pagination = query.order_by(rank, Book.created_at.desc(), Book.id.desc()).paginate(
+            page=page, per_page=per_page, error_out=False, count=count
+        )
+        pagination.next_cursor = None
+        return pagination
+
+    return KeysetPagination(
+        query=query.order_by(Book.created_at.desc(), Book.id.desc()),
+        cursor=cursor,
+        page=page,
+        per_page=per_page,
+        error_out=False,
+        count=count
+    )
+
+
+def apply_category_filter(query, category_filter):
+    """Restrict a Book query to a category, mapping 'educational' like PHP"""
+    if category_filter:
+        if category_filter.lower() == 'educational':
+            query = query.filter(
+                db.or_(
+                    Book.category == 'science',
+                    Book.category == 'guide'
+                )
+            )
+        else:
+            query = query.filter(Book.category == category_filter)
+    return query
+
+
+def listing_page(search_query='', category_filter='', rating_filter=0, page=1, per_page=12,
+                 cursor=None, count=True, sort=''):
+    """Load one page of listed (active, available, unexpired) books with their rating stats.
+
+    Ratings come from the denormalized rating summaries and the search,
+    rating filter, ordering and pagination all run in SQL, so a page costs
+    two queries (page + total) regardless of catalog size. Unranked listings
+    page by (created_at, id) cursor; search results are ordered by relevance
+    and page by OFFSET; sort='ending_soon' lists soonest-expiring books first.
+    Returns a pagination object whose items are books.
+    """
+    query = db.session.query(Book, RatingSummary).outerjoin(
+        RatingSummary, RatingSummary.book_id == Book.id
+    ).filter(listed_condition())
+    query, rank = apply_search(query, search_query)
+    if sort == 'ending_soon':
+        rank = Book.availability_expires_at.asc()
+    query = apply_category_filter(query, category_filter)
+
+    if rating_filter:
+        # avg >= filter, rewritten to avoid division on the summary columns
+        query = query.filter(
+            RatingSummary.rating_count > 0,
+            RatingSummary.rating_sum >= rating_filter * RatingSummary.rating_count
+        )
+
+    pagination = paginate_books(query, rank, page=page, per_page=per_page, cursor=cursor, count=count)
+
+    books = []
+    for book, summary in pagination.items:
+        book.average_rating = summary.average_rating if summary else 0
+        book.rating_count = summary.rating_count if summary else 0
+        books.append(book)
+    pagination.items = books
+
+    return pagination
+
+
+def owner_books(user_id):
+    """A user's active books with rating stats and their own rating, in one query.
+
+    Returns (book, summary, own_rating) rows, newest first; summary and
+    own_rating are None when missing.
+    """
+    return db.session.query(Book, RatingSummary, Review.rating).outerjoin(
+        RatingSummary, RatingSummary.book_id == Book.id
+    ).outerjoin(
+        Review, db.and_(Review.book_id == Book.id, Review.user_id == user_id)
+    ).filter(
+        Book.user_id == user_id,
+        Book.active == True
+    ).order_by(Book.created_at.desc()).all()
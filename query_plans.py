@@ -0,0 +1,184 @@
+from app import db
+from models import User, Book, BorrowRequest
+from queries import encode_cursor
+from availability import listed_condition
+from borrowing import load_borrow_context
+from sqlalchemy import event
+import re
+import threading
+
+# Read-only pages whose queries must all be index-backed
+ANONYMOUS_PATHS = [
+    '/',
+    '/?page=2',
+    '/?search=dragon',
+    '/?genre=Educational',
+    '/?rating=3',
+    '/?sort=ending_soon',
+    '/books',
+    '/books?search=dragon',
+    '/api/books',
+]
+LOGGED_IN_PATHS = ['/', '/dashboard', '/dashboard?inbox_page=2']
+# Title of the throwaway book the write scenarios add, edit and delete
+SCRATCH_TITLE = 'Query plan check'
+
+# SQLite plan lines that read a whole table rather than an index range
+_SQLITE_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+# Schema lookups (e.g. "does the FTS table exist") scan the tiny catalog table
+_SQLITE_CATALOG = ('sqlite_master', 'sqlite_schema')
+
+
+class UnsupportedDatabaseError(ValueError):
+    """Raised when there is no EXPLAIN reader for the configured database"""
+
+
+class QueryCapture:
+    """Record the statements this thread sends to the database"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        self._thread = threading.get_ident()
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        # Background jobs share the engine; only keep this thread's queries.
+        # Plain INSERT ... VALUES reads nothing, so there is no plan to check.
+        if threading.get_ident() == self._thread and statement.lstrip()[:6].upper() in ('SELECT', 'UPDATE', 'DELETE'):
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+
+def full_scans(connection, statement, parameters):
+    """Tables a statement reads in full, according to the database's EXPLAIN"""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        return [
+            match.group(1) for match in (_SQLITE_SCAN.match(row[-1]) for row in rows)
+            if match and match.group(1) not in _SQLITE_CATALOG
+        ]
+    if dialect == 'mysql':
+        rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).mappings().fetchall()
+        return [row['table'] for row in rows if row['type'] == 'ALL']
+    if dialect == 'postgresql':
+        rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).fetchall()
+        return [re.search(r'Seq Scan on (\w+)', row[0]).group(1) for row in rows if 'Seq Scan on' in row[0]]
+    raise UnsupportedDatabaseError(f"Can't check query plans on {dialect}; use SQLite, MySQL or PostgreSQL")
+
+
+def _write_scenarios(owner, borrower, book):
+    """(label, method, path, kwargs, user) for every route that writes.
+
+    Rates and requests `book` as `borrower`, then answers a request and
+    adds, edits, toggles and deletes a scratch book as `owner`.
+    """
+    pending = BorrowRequest.query.join(Book, BorrowRequest.book_id == Book.id).filter(
+        Book.user_id == owner.id,
+        BorrowRequest.status == 'pending'
+    ).order_by(BorrowRequest.id).first()
+
+    def scratch_book_id():
+        scratch = Book.query.filter_by(user_id=owner.id, title=SCRATCH_TITLE).order_by(Book.id.desc()).first()
+        return scratch.id if scratch else 0
+
+    scenarios = [
+        ('POST /submit-rating (new)', '/submit-rating', {'json': {'book_id': book.id, 'rating': 4}}, borrower),
+        ('POST /submit-rating (changed)', '/submit-rating', {'json': {'book_id': book.id, 'rating': 2}}, borrower),
+        ('POST /api/borrow-request', '/api/borrow-request', {'data': {'book_id': book.id, 'message': 'Query plan check'}}, borrower),
+        ('POST /dashboard update_profile', '/dashboard', {'data': {
+            'action': 'update_profile', 'name': f"{owner.first_name or owner.username} {owner.last_name or ''}".strip(),
+            'notification_mode': owner.notification_mode or 'immediate'
+        }}, owner),
+        ('POST /dashboard add_book', '/dashboard', {'data': {
+            'action': 'add_book', 'title': SCRATCH_TITLE, 'author': 'BorrowBee', 'genre': 'Non-Fiction'
+        }}, owner),
+        ('POST /dashboard update_book', '/dashboard', lambda: {'data': {
+            'action': 'update_book', 'book_id': scratch_book_id(), 'title': SCRATCH_TITLE,
+            'author': 'BorrowBee', 'genre': 'Non-Fiction', 'availability_period': 'week'
+        }}, owner),
+        ('POST /dashboard toggle_availability', '/dashboard', lambda: {'data': {
+            'action': 'toggle_availability', 'book_id': scratch_book_id(), 'new_status': 0
+        }}, owner),
+        ('POST /dashboard delete_book', '/dashboard', lambda: {'data': {
+            'action': 'delete_book', 'book_id': scratch_book_id()
+        }}, owner),
+    ]
+    if pending:
+        scenarios.append(('POST /dashboard respond_request', '/dashboard', {'data': {
+            'action': 'respond_request', 'request_id': pending.id, 'decision': 'rejected'
+        }}, owner))
+    return scenarios
+
+
+def capture_route_queries(app, include_writes=False):
+    """Run the read-only routes and borrow lookups, returning (label, statement, parameters).
+
+    With include_writes the rating, borrow and dashboard POSTs run too. They
+    change the database, so only use that on a disposable seeded copy.
+    """
+    captured = []
+    client = app.test_client()
+    book = Book.query.filter(listed_condition()).order_by(Book.created_at.desc(), Book.id.desc()).first()
+    user = User.query.order_by(User.id).first()
+    borrower = User.query.filter(User.id != book.user_id).first() if book else None
+
+    paths = list(ANONYMOUS_PATHS)
+    if book:
+        paths += [f'/book/{book.id}', f'/?cursor={encode_cursor(book)}', f'/api/books?cursor={encode_cursor(book)}']
+
+    def run(label, call):
+        with QueryCapture(db.engine) as capture:
+            call()
+        captured.extend((label, statement, parameters) for statement, parameters in capture.statements)
+
+    for path in paths:
+        run(f"GET {path}", lambda: client.get(path))
+
+    if user:
+        with client.session_transaction() as session:
+            session['user_id'] = user.id
+        for path in LOGGED_IN_PATHS + ([f'/book/{book.id}'] if book else []):
+            run(f"GET {path} (logged in)", lambda: client.get(path))
+
+    if book and borrower:
+        run("borrow request lookup", lambda: load_borrow_context(book.id, borrower.id))
+
+    if include_writes and book and borrower:
+        owner = db.session.get(User, book.user_id)
+        # A borrower without an active request, so the request is really inserted
+        active = db.select(BorrowRequest.user_id).where(
+            BorrowRequest.book_id == book.id,
+            BorrowRequest.status.in_(('pending', 'approved'))
+        )
+        borrower = User.query.filter(User.id != owner.id, User.id.notin_(active)).order_by(User.id).first() or borrower
+        for label, path, options, acting_user in _write_scenarios(owner, borrower, book):
+            with client.session_transaction() as session:
+                session['user_id'] = acting_user.id
+            request_options = options() if callable(options) else options
+            run(label, lambda: client.post(path, **request_options))
+
+    return captured
+
+
+def check_query_plans(app, include_writes=False):
+    """EXPLAIN every captured route query.
+
+    Returns the number of queries checked and a (label, statement, tables)
+    entry for each one that reads a whole table. See capture_route_queries()
+    for include_writes.
+    """
+    failures = []
+    captured = capture_route_queries(app, include_writes)
+    with db.engine.connect() as connection:
+        for label, statement, parameters in captured:
+            tables = full_scans(connection, statement, parameters)
+            if tables:
+                failures.append((label, statement, tables))
+    return len(captured), failures
@@ -0,0 +1,112 @@
+from flask import g
+from app import db
+from models import Book, Review, RatingSummary
+from borrowing import insert_or_ignore
+import logging
+
+
+def star_column(rating):
+    """Histogram column on RatingSummary for a 1-5 star rating"""
+    return getattr(RatingSummary, f'stars_{rating}')
+
+
+def get_or_create_summary(book_id):
+    """Load a book's rating summary, adding an empty one if it has none yet.
+
+    Two first ratings of a book may race to add the row; the loser's insert
+    is ignored and both go on to bump the same row's counters.
+    """
+    summary = db.session.get(RatingSummary, book_id)
+    if summary is None:
+        insert_or_ignore(RatingSummary.__table__, {
+            'book_id': book_id,
+            'rating_sum': 0,
+            'rating_count': 0,
+            'stars_1': 0,
+            'stars_2': 0,
+            'stars_3': 0,
+            'stars_4': 0,
+            'stars_5': 0
+        })
+        summary = db.session.get(RatingSummary, book_id)
+    return summary
+
+
+def record_rating(book_id, rating, previous_rating=None):
+    """Apply a new or changed rating to the book's summary.
+
+    Counters are bumped with SQL expressions so concurrent raters never
+    overwrite each other; the caller commits together with the Review write.
+    """
+    summary = get_or_create_summary(book_id)
+
+    if previous_rating is None:
+        summary.rating_sum = RatingSummary.rating_sum + rating
+        summary.rating_count = RatingSummary.rating_count + 1
+        setattr(summary, f'stars_{rating}', star_column(rating) + 1)
+    elif previous_rating != rating:
+        summary.rating_sum = RatingSummary.rating_sum + (rating - previous_rating)
+        setattr(summary, f'stars_{previous_rating}', star_column(previous_rating) - 1)
+        setattr(summary, f'stars_{rating}', star_column(rating) + 1)
+
+    return summary
+
+
+def user_ratings(user_id, book_ids):
+    """Map each book id to the user's own rating (0 if unrated).
+
+    All uncached books are fetched with one IN (...) query and the results are
+    memoized on flask.g, so a (user, book) pair is read at most once per request.
+    """
+    cache = g.setdefault('user_ratings', {})
+    missing = {book_id for book_id in book_ids if (user_id, book_id) not in cache}
+
+    if missing:
+        for book_id in missing:
+            cache[(user_id, book_id)] = 0
+        rows = db.session.query(Review.book_id, Review.rating).filter(
+            Review.user_id == user_id,
+            Review.book_id.in_(missing)
+        ).all()
+        for book_id, rating in rows:
+            cache[(user_id, book_id)] = rating
+
+    return {book_id: cache[(user_id, book_id)] for book_id in book_ids}
+
+
+def delete_summary(book_id):
+    """Remove the rating summary of a deleted book"""
+    RatingSummary.query.filter_by(book_id=book_id).delete()
+
+
+def rebuild_rating_summaries():
+    """Recompute every rating summary from the reviews table to fix drift.
+
+    Reviews of deleted books are skipped, since their summary rows would
+    violate the foreign key on books.
+    """
+    try:
+        rows = db.session.query(
+            Review.book_id,
+            db.func.sum(Review.rating),
+            db.func.count(Review.id),
+            *[db.func.sum(db.case((Review.rating == star, 1), else_=0)) for star in range(1, 6)]
+        ).join(Book, Book.id == Review.book_id).group_by(Review.book_id).all()
+
+        RatingSummary.query.delete()
+        db.session.bulk_insert_mappings(RatingSummary, [
+            {
+                'book_id': book_id,
+                'rating_sum': int(rating_sum or 0),
+                'rating_count': int(rating_count or 0),
+                **{f'stars_{star}': int(stars[star - 1] or 0) for star in range(1, 6)}
+            }
+            for book_id, rating_sum, rating_count, *stars in rows
+        ])
+        db.session.commit()
+        logging.info("Rebuilt rating summaries for %s books", len(rows))
+        return len(rows)
+    except Exception as e:
+        logging.error("Error rebuilding rating summaries: %s", e)
+        db.session.rollback()
+        raise
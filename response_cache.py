@@ -0,0 +1,191 @@
+from flask import current_app, g, make_response, request, session
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+import logging
+import threading
+import time
+import uuid
+
+CATALOG_VERSION_KEY = 'borrowbee:catalog_version'
+
+
+class InProcessResponseCache:
+    """LRU cache of rendered responses bounded by total body size.
+
+    Entries also expire after their TTL. The catalog version lives in this
+    process only, so with several workers use a shared backend instead.
+    Versions are random tokens, so a restarted process never reuses one.
+    """
+
+    # Other processes don't see this cache's catalog version
+    shared = False
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._version = uuid.uuid4().hex
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        value, expires_at = self._entries.pop(key)
+        self.size -= len(value)
+
+    def catalog_version(self):
+        return self._version
+
+    def bump_catalog_version(self):
+        with self._lock:
+            self._version = uuid.uuid4().hex
+            # Older versions can never be read again
+            self._entries.clear()
+            self.size = 0
+
+
+class RedisResponseCache:
+    """Response cache shared by every worker through Redis.
+
+    Eviction is left to Redis (configure maxmemory with an LRU policy);
+    entries carry the TTL. Catalog versions are random tokens, so an
+    evicted or flushed version is replaced rather than restarted at 0.
+    """
+
+    shared = True
+
+    def __init__(self, url, prefix='borrowbee:response:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def catalog_version(self):
+        version = self.client.get(CATALOG_VERSION_KEY)
+        if version is None:
+            # First use, or evicted: every worker adopts whichever token is set first
+            self.client.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, nx=True)
+            version = self.client.get(CATALOG_VERSION_KEY)
+        return version.decode()
+
+    def bump_catalog_version(self):
+        self.client.set(CATALOG_VERSION_KEY, uuid.uuid4().hex)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Process-wide response cache backend, created on first use.
+
+    RESPONSE_CACHE_URL selects a shared backend (redis://...); without it
+    responses are cached in this process.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                url = current_app.config.get('RESPONSE_CACHE_URL')
+                if url:
+                    _cache = RedisResponseCache(url)
+                else:
+                    _cache = InProcessResponseCache(current_app.config.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    return _cache
+
+
+def bump_catalog_version():
+    """Invalidate cached listings after a book or rating write is committed"""
+    try:
+        get_response_cache().bump_catalog_version()
+    except Exception as e:
+        # Cached pages then go stale for at most RESPONSE_CACHE_TTL seconds,
+        # listing ETags for at most LISTING_ETAG_MAX_AGE
+        logging.error("Error bumping catalog version: %s", e)
+
+
+def skip_response_cache():
+    """Keep the current response out of the cache, e.g. an error page"""
+    g.skip_response_cache = True
+
+
+def response_cache_key(params, defaults):
+    """Cache key for this request from its path and normalized query parameters"""
+    values = []
+    for name in params:
+        value = request.args.get(name, '').strip()
+        if value and value != defaults.get(name):
+            values.append((name, value))
+    return f"{request.path}?{urlencode(values)}"
+
+
+def cache_anonymous_response(*params, defaults=None):
+    """Serve GETs by visitors without a session from the response cache.
+
+    Only `params` are part of the key, after stripping and dropping empty
+    or default values. Entries are keyed on the catalog version, so any
+    bump_catalog_version() call retires them all.
+    """
+    defaults = defaults or {}
+
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            ttl = current_app.config.get('RESPONSE_CACHE_TTL', 0)
+            # Logged-in users and pending flash messages always render fresh
+            if not ttl or request.method != 'GET' or session:
+                return view(*args, **kwargs)
+
+            try:
+                cache = get_response_cache()
+                key = f"{cache.catalog_version()}:{response_cache_key(params, defaults)}"
+                cached = cache.get(key)
+            except Exception as e:
+                logging.error("Response cache unavailable: %s", e)
+                return view(*args, **kwargs)
+
+            if cached is not None:
+                mimetype, body = cached.split(b'\n', 1)
+                response = make_response(body)
+                response.mimetype = mimetype.decode()
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if (response.status_code == 200 and not response.direct_passthrough
+                    and not g.get('skip_response_cache') and 'Set-Cookie' not in response.headers):
+                try:
+                    cache.set(key, response.mimetype.encode() + b'\n' + response.get_data(), ttl)
+                except Exception as e:
+                    logging.error("Error caching response: %s", e)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return decorated_function
+    return decorator
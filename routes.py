@@ -1,74 +1,51 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, make_response, send_from_directory
 from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
+from datetime import datetime
 from sqlalchemy import text
 from app import db
-from models import User, Book, Review, BorrowRequest
+from models import User, Book, Review, RatingSummary
 from auth import login_required
-from email_service import send_borrow_request_email
+from email_service import build_borrow_request_email
+from outbox import enqueue_email, wake_outbox
+from queries import listing_page, paginate_books, owner_books
+from search import apply_search
+from availability import get_availability_status, refresh_expiry, listed_condition
+from ratings import record_rating, get_or_create_summary, delete_summary, user_ratings
+from borrowing import (load_borrow_context, create_borrow_request, respond_to_request, delete_book_requests,
+                       outgoing_requests, incoming_requests)
+from response_cache import cache_anonymous_response, bump_catalog_version, skip_response_cache
+from conditional import book_validators, conditional_listing, is_not_modified, not_modified, add_validators
+from images import cover_folder, cover_from_upload, cover_urls
+from assets import dist_folder
+from identity import current_user, invalidate_identity
+from logging_setup import sampled
 import logging
-import math
-
-def get_availability_status(book):
-    """Calculate availability status and auto-disable expired books"""
-    if not book.availability_start_date:
-        return {
-            'status': 'expired',
-            'color': 'red', 
-            'message': 'No start date',
-            'expired': True,
-            'available': book.available,
-            'days_left': 0
-        }
-    
-    current_date = datetime.utcnow()
-    start_date = book.availability_start_date
-    
-    # Calculate expiry date based on period
-    if book.availability_period == '3days':
-        expiry_date = start_date + timedelta(days=3)
-    elif book.availability_period == 'week':
-        expiry_date = start_date + timedelta(days=7)
-    elif book.availability_period == 'month':
-        expiry_date = start_date + timedelta(days=30)
-    else:
-        expiry_date = start_date + timedelta(days=7)
-    
-    is_expired = current_date > expiry_date
-    
-    if is_expired and book.available:
-        # Auto-disable book when expired
-        book.available = False
-        db.session.commit()
-    
-    if is_expired:
-        return {
-            'status': 'expired',
-            'color': 'red',
-            'message': 'Expired',
-            'expired': True,
-            'available': book.available,
-            'days_left': 0
-        }
-    else:
-        days_left = (expiry_date - current_date).days
-        return {
-            'status': 'active',
-            'color': 'green',
-            'message': f"Active ({days_left} days left)",
-            'expired': False,
-            'available': book.available,
-            'days_left': days_left
-        }
+import mimetypes
+import os
 
 main_bp = Blueprint('main', __name__)
 
+# Query parameters that select a listing page, for cache keys and ETags
+INDEX_PARAMS = ('search', 'genre', 'rating', 'page', 'cursor', 'sort')
+INDEX_PARAM_DEFAULTS = {'rating': '0', 'page': '1'}
+BOOKS_PARAMS = ('search', 'category', 'page', 'cursor')
+BOOKS_PARAM_DEFAULTS = {'page': '1'}
+
 @main_bp.route('/book/<int:book_id>')
 def book_detail(book_id):
     """Book detail page with borrow functionality"""
     try:
-        # Get book details with owner information
-        book = db.session.query(Book, User).join(User, Book.user_id == User.id).filter(
+        # Answer repeat visits from cached validators before loading anything
+        validators = book_validators(book_id)
+        if validators and is_not_modified(*validators):
+            return not_modified(*validators)
+        
+        # Get book details with owner information and rating summary
+        book = db.session.query(Book, User, RatingSummary).join(
+            User, Book.user_id == User.id
+        ).outerjoin(
+            RatingSummary, RatingSummary.book_id == Book.id
+        ).filter(
             Book.id == book_id,
             Book.active == True
         ).first()
@@ -77,43 +54,38 @@ def book_detail(book_id):
             flash('Book not found.', 'error')
             return redirect(url_for('main.index'))
         
-        book_obj, owner = book
-        
-        # Get book ratings and reviews
-        rating_data = db.session.query(
-            db.func.coalesce(db.func.avg(Review.rating), 0).label('avg_rating'),
-            db.func.count(Review.id).label('rating_count')
-        ).filter(Review.book_id == book_id).first()
+        book_obj, owner, summary = book
         
-        average_rating = float(rating_data.avg_rating) if rating_data.avg_rating else 0
-        rating_count = int(rating_data.rating_count) if rating_data.rating_count else 0
+        average_rating = summary.average_rating if summary else 0
+        rating_count = summary.rating_count if summary else 0
         
         # Get user's rating if logged in
         user_rating = 0
         if session.get('user_id'):
-            user_review = Review.query.filter_by(
-                book_id=book_id, 
-                user_id=session['user_id']
-            ).first()
-            user_rating = user_review.rating if user_review else 0
+            user_rating = user_ratings(session['user_id'], [book_id])[book_id]
         
         # Get availability status
         availability_status = get_availability_status(book_obj)
         
-        return render_template('book_detail.html',
-                             book=book_obj,
-                             owner=owner,
-                             average_rating=average_rating,
-                             rating_count=rating_count,
-                             user_rating=user_rating,
-                             availability_status=availability_status)
+        response = make_response(render_template('book_detail.html',
+                                                 book=book_obj,
+                                                 owner=owner,
+                                                 average_rating=average_rating,
+                                                 rating_count=rating_count,
+                                                 user_rating=user_rating,
+                                                 availability_status=availability_status))
+        if validators:
+            add_validators(response, *validators)
+        return response
                              
     except Exception as e:
-        logging.error(f"Error loading book detail: {e}")
+        logging.error("Error loading book detail: %s", e)
         flash('Error loading book details. Please try again.', 'error')
         return redirect(url_for('main.index'))
 
 @main_bp.route('/')
+@conditional_listing(*INDEX_PARAMS, defaults=INDEX_PARAM_DEFAULTS)
+@cache_anonymous_response(*INDEX_PARAMS, defaults=INDEX_PARAM_DEFAULTS)
 def index():
     """Homepage with search, filters, and pagination - exactly like PHP version"""
     try:
@@ -126,93 +98,106 @@ def index():
         # Get pagination parameters
         page = max(1, int(request.args.get('page', 1)))
         per_page = 12
-        offset = (page - 1) * per_page
-        
-        # Build base query with active and available books
-        query = Book.query.filter(Book.active == True, Book.available == True)
-        
-        # Apply search filter
-        if search_query:
-            search_pattern = f"%{search_query}%"
-            query = query.filter(
-                db.or_(
-                    Book.title.ilike(search_pattern),
-                    Book.author.ilike(search_pattern),
-                    Book.description.ilike(search_pattern)
-                )
-            )
-        
-        # Apply category filter
-        if category_filter:
-            if category_filter.lower() == 'educational':
-                # Map educational to science and guide categories like PHP
-                query = query.filter(
-                    db.or_(
-                        Book.category == 'science',
-                        Book.category == 'guide'
-                    )
-                )
-            else:
-                query = query.filter(Book.category == category_filter)
-        
-        # Get books with ratings
-        books_with_ratings = []
-        all_books = query.order_by(Book.created_at.desc()).all()
-        
-        for book in all_books:
-            # Get average rating and count
-            rating_data = db.session.query(
-                db.func.coalesce(db.func.avg(Review.rating), 0).label('avg_rating'),
-                db.func.count(Review.rating).label('rating_count')
-            ).filter(Review.book_id == book.id).first()
-            
-            book.average_rating = float(rating_data.avg_rating) if rating_data.avg_rating else 0
-            book.rating_count = rating_data.rating_count if rating_data.rating_count else 0
-            
-            # Get user's rating if logged in
-            book.user_rating = 0
-            if session.get('user_id'):
-                user_review = Review.query.filter_by(
-                    book_id=book.id, 
-                    user_id=session['user_id']
-                ).first()
-                book.user_rating = user_review.rating if user_review else 0
-            
-            # Apply rating filter
-            if rating_filter == 0 or book.average_rating >= rating_filter:
-                books_with_ratings.append(book)
+        cursor = request.args.get('cursor', '').strip() or None
+        sort = request.args.get('sort', '').strip()
+        
+        # Load one page of books with rating stats, filtered and paginated in SQL
+        pagination = listing_page(
+            search_query=search_query,
+            category_filter=category_filter,
+            rating_filter=rating_filter,
+            page=page,
+            per_page=per_page,
+            cursor=cursor,
+            sort=sort
+        )
+        recent_books = pagination.items
+        total_books = pagination.total
+        total_pages = max(pagination.pages, 1)
         
-        # Pagination
-        total_books = len(books_with_ratings)
-        total_pages = math.ceil(total_books / per_page) if total_books > 0 else 1
-        start_idx = offset
-        end_idx = start_idx + per_page
-        recent_books = books_with_ratings[start_idx:end_idx]
+        # Get user's ratings for the whole page in one query if logged in
+        own_ratings = {}
+        if session.get('user_id'):
+            own_ratings = user_ratings(session['user_id'], [book.id for book in recent_books])
+        for book in recent_books:
+            book.user_rating = own_ratings.get(book.id, 0)
         
         return render_template('index.html',
                              recent_books=recent_books,
                              search_query=search_query,
                              category_filter=category_filter,
                              rating_filter=rating_filter,
+                             sort=sort,
                              page=page,
                              total_pages=total_pages,
-                             total_books=total_books)
+                             total_books=total_books,
+                             next_cursor=pagination.next_cursor)
     except Exception as e:
-        logging.error(f"Error loading home page: {e}")
+        logging.error("Error loading home page: %s", e)
+        skip_response_cache()
         return render_template('index.html',
                              recent_books=[],
                              search_query='',
                              category_filter='',
                              rating_filter=0,
+                             sort='',
                              page=1,
                              total_pages=0,
-                             total_books=0)
+                             total_books=0,
+                             next_cursor=None)
+
+@main_bp.route('/api/books')
+@conditional_listing(*INDEX_PARAMS, defaults=INDEX_PARAM_DEFAULTS)
+@cache_anonymous_response(*INDEX_PARAMS, defaults=INDEX_PARAM_DEFAULTS)
+def api_books():
+    """Next page of homepage books as JSON for "load more" / infinite scroll"""
+    try:
+        search_query = request.args.get('search', '').strip()
+        category_filter = request.args.get('genre', '').strip()
+        rating_filter_str = request.args.get('rating', '0').strip()
+        rating_filter = float(rating_filter_str) if rating_filter_str else 0
+        page = max(1, int(request.args.get('page', 1)))
+        cursor = request.args.get('cursor', '').strip() or None
+        sort = request.args.get('sort', '').strip()
+        
+        pagination = listing_page(
+            search_query=search_query,
+            category_filter=category_filter,
+            rating_filter=rating_filter,
+            page=page,
+            per_page=12,
+            cursor=cursor,
+            count=False,
+            sort=sort
+        )
+        
+        books = [{
+            'id': book.id,
+            'title': book.title,
+            'author': book.author,
+            'category': book.category,
+            'cover_image': book.cover_image,
+            'cover': cover_urls(book, 'card'),
+            'average_rating': book.average_rating,
+            'rating_count': book.rating_count,
+            'url': url_for('main.book_detail', book_id=book.id)
+        } for book in pagination.items]
+        
+        return jsonify({
+            'success': True,
+            'books': books,
+            'next_cursor': pagination.next_cursor,
+            'next_page': page + 1 if pagination.has_next else None
+        })
+    except Exception as e:
+        logging.error("Error loading books feed: %s", e)
+        skip_response_cache()
+        return jsonify({'success': False, 'message': 'Failed to load books'})
 
 @main_bp.route('/submit-rating', methods=['POST'])
 @login_required
 def submit_rating():
     """Submit book rating"""
-    logging.info(f"Rating submission attempt from user {session.get('user_id')}")
     try:
         # Handle both JSON and form data
         if request.is_json:
@@ -233,8 +218,10 @@ def submit_rating():
         ).first()
         
         if existing_review:
+            previous_rating = existing_review.rating
             existing_review.rating = rating
         else:
+            previous_rating = None
             new_review = Review(
                 book_id=book_id,
                 user_id=session['user_id'],
@@ -242,23 +229,20 @@ def submit_rating():
             )
             db.session.add(new_review)
         
+        # Update the rating summary in the same transaction as the review
+        summary = record_rating(book_id, rating, previous_rating)
         db.session.commit()
-        
-        # Get updated average rating
-        rating_data = db.session.query(
-            db.func.avg(Review.rating).label('avg_rating'),
-            db.func.count(Review.rating).label('rating_count')
-        ).filter(Review.book_id == book_id).first()
+        bump_catalog_version()
         
         response_data = {
             'success': True,
-            'new_average': float(rating_data.avg_rating),
-            'rating_count': rating_data.rating_count
+            'new_average': summary.average_rating,
+            'rating_count': summary.rating_count
         }
-        logging.info(f"Sending response: {response_data}")
+        logging.info("User %s rated book %s: %s", session['user_id'], book_id, rating, extra=sampled())
         return jsonify(response_data)
     except Exception as e:
-        logging.error(f"Error submitting rating: {e}")
+        logging.error("Error submitting rating: %s", e)
         return jsonify({'success': False, 'message': 'Failed to submit rating'})
 
 @main_bp.route('/api/borrow-request', methods=['POST'])
@@ -278,13 +262,8 @@ def api_borrow_request():
         if not message:
             return jsonify({'success': False, 'message': 'Please include a message with your request'})
         
-        # Check if book exists and is active - exact SQL from PHP
-        book_query = db.session.execute(text("""
-            SELECT b.id, b.title, b.user_id, u.username as owner_username, u.email as owner_email
-            FROM books b
-            JOIN users u ON b.user_id = u.id
-            WHERE b.id = :book_id AND b.active = TRUE
-        """), {'book_id': book_id}).fetchone()
+        # Book, owner, borrower and any active request in one round trip
+        book_query = load_borrow_context(book_id, user_id)
         
         if not book_query:
             return jsonify({'success': False, 'message': 'Book not found or not available'})
@@ -295,58 +274,43 @@ def api_borrow_request():
         if book_data['user_id'] == user_id:
             return jsonify({'success': False, 'message': 'You cannot borrow your own book'})
         
-        # Check if user has already requested this book - exact SQL from PHP
-        existing_query = db.session.execute(text("""
-            SELECT id, status FROM borrow_requests 
-            WHERE book_id = :book_id AND user_id = :user_id 
-            AND status IN ('pending', 'approved')
-        """), {'book_id': book_id, 'user_id': user_id}).fetchone()
-        
-        if existing_query:
-            existing_data = dict(existing_query._mapping)
+        # Check if user has already requested this book
+        if book_data['existing_status']:
             status_message = ('You already have a pending request for this book' 
-                            if existing_data['status'] == 'pending' 
+                            if book_data['existing_status'] == 'pending' 
                             else 'You have already been approved to borrow this book')
             return jsonify({'success': False, 'message': status_message})
         
-        # Insert borrow request - exact SQL from PHP
-        db.session.execute(text("""
-            INSERT INTO borrow_requests (book_id, user_id, message, status, created_at) 
-            VALUES (:book_id, :user_id, :message, 'pending', NOW())
-        """), {'book_id': book_id, 'user_id': user_id, 'message': message})
-        
-        # Get borrower info for email
-        borrower_query = db.session.execute(text("""
-            SELECT username, email FROM users WHERE id = :user_id
-        """), {'user_id': user_id}).fetchone()
-        
-        borrower_data = dict(borrower_query._mapping)
+        # Owners in digest mode get this request in their next digest instead
+        notify_now = book_data['owner_notification_mode'] != 'digest'
+        
+        # The unique index rejects a duplicate that raced past the check above
+        if not create_borrow_request(book_id, user_id, book_data['user_id'], message, notify_now):
+            db.session.rollback()
+            return jsonify({'success': False, 'message': 'You already have a pending request for this book'})
+        
+        # Queue email notification to book owner in the same transaction
+        if notify_now:
+            subject, body = build_borrow_request_email(
+                from_user_name=book_data['borrower_username'],
+                book_title=book_data['title'],
+                message=message,
+                from_user_email=book_data['borrower_email']
+            )
+            enqueue_email(book_data['owner_email'], subject, body)
         
         db.session.commit()
+        if notify_now:
+            wake_outbox()
         
-        # Send email notification to book owner
-        email_sent = send_borrow_request_email(
-            to_email=book_data['owner_email'],
-            from_user_name=borrower_data['username'],
-            book_title=book_data['title'],
-            message=message,
-            from_user_email=borrower_data['email']
-        )
-        
-        if email_sent:
-            return jsonify({
-                'success': True,
-                'message': 'Borrow request sent successfully! The book owner will be notified via email.'
-            })
-        else:
-            return jsonify({
-                'success': True,
-                'message': 'Borrow request sent successfully! Email notification failed, but your request was saved.'
-            })
+        return jsonify({
+            'success': True,
+            'message': 'Borrow request sent successfully! The book owner will be notified via email.'
+        })
         
     except Exception as e:
         db.session.rollback()
-        logging.error(f"Borrow request error: {e}")
+        logging.error("Borrow request error: %s", e)
         return jsonify({'success': False, 'message': 'Failed to send request. Please try again.'})
 
 @main_bp.route('/dashboard', methods=['GET', 'POST'])
@@ -355,7 +319,7 @@ def dashboard():
     """User dashboard with book management"""
     try:
         user_id = session['user_id']
-        user = User.query.get(user_id)
+        user = current_user()
         
         if not user:
             flash('User not found. Please login again.', 'error')
@@ -366,6 +330,8 @@ def dashboard():
             name = request.form.get('name', '').strip()
             phone = request.form.get('phone', '').strip()
             address = request.form.get('address', '').strip()
+            notification_mode = request.form.get('notification_mode', 'immediate')
+            digest_interval = request.form.get('digest_interval_minutes', '15')
             
             if name:
                 name_parts = name.split(' ', 1)
@@ -373,9 +339,13 @@ def dashboard():
                 user.last_name = name_parts[1] if len(name_parts) > 1 else ''
                 user.bio = phone
                 user.location = address
+                user.notification_mode = 'digest' if notification_mode == 'digest' else 'immediate'
+                user.digest_interval_minutes = max(1, int(digest_interval)) if digest_interval.isdigit() else 15
                 user.updated_at = datetime.utcnow()
                 
                 db.session.commit()
+                invalidate_identity(user_id)
+                bump_catalog_version()
                 flash('Profile updated successfully!', 'success')
             else:
                 flash('Name is required.', 'error')
@@ -389,15 +359,19 @@ def dashboard():
             description = request.form.get('description', '').strip()
             cover_image = request.form.get('image_url', '').strip()
             availability_period = request.form.get('availability_period', 'week')
+            cover_hash, cover_error = cover_from_upload(request.files.get('cover_image'))
             
-            if title and author and category:
+            if cover_error:
+                flash(cover_error, 'error')
+            elif title and author and category:
                 book = Book(
                     title=title,
                     author=author,
                     category=category,
                     age_group=age_group,
                     description=description,
-                    cover_image=cover_image,
+                    cover_image=None if cover_hash else cover_image,
+                    cover_hash=cover_hash,
                     user_id=user_id,
                     available=True,
                     active=True,
@@ -406,8 +380,12 @@ def dashboard():
                     created_at=datetime.utcnow(),
                     updated_at=datetime.utcnow()
                 )
+                refresh_expiry(book)
                 db.session.add(book)
+                db.session.flush()
+                get_or_create_summary(book.id)
                 db.session.commit()
+                bump_catalog_version()
                 flash('Book added successfully!', 'success')
             else:
                 flash('Title, author, and genre are required.', 'error')
@@ -416,19 +394,31 @@ def dashboard():
         elif request.method == 'POST' and request.form.get('action') == 'update_book':
             book_id = int(request.form.get('book_id', 0))
             book = Book.query.filter_by(id=book_id, user_id=user_id).first()
+            cover_hash, cover_error = cover_from_upload(request.files.get('cover_image'))
             
-            if book:
+            if cover_error:
+                flash(cover_error, 'error')
+            elif book:
                 book.title = request.form.get('title', '').strip()
                 book.author = request.form.get('author', '').strip()
                 book.category = request.form.get('genre', '').strip()
                 book.age_group = request.form.get('age_group', '').strip()
                 book.description = request.form.get('description', '').strip()
-                book.cover_image = request.form.get('image_url', '').strip()
+                # A new upload or URL replaces the cover; leaving both empty keeps it
+                image_url = request.form.get('image_url', '').strip()
+                if cover_hash:
+                    book.cover_hash = cover_hash
+                    book.cover_image = None
+                elif image_url:
+                    book.cover_image = image_url
+                    book.cover_hash = None
                 book.availability_period = request.form.get('availability_period', 'week')
                 book.availability_start_date = datetime.utcnow()
                 book.updated_at = datetime.utcnow()
+                refresh_expiry(book)
                 
                 db.session.commit()
+                bump_catalog_version()
                 flash('Book updated successfully!', 'success')
             else:
                 flash('Book not found.', 'error')
@@ -444,6 +434,7 @@ def dashboard():
                     # Reactivate this specific book
                     book.available = True
                     book.availability_start_date = datetime.utcnow()
+                    refresh_expiry(book)
                 else:
                     # Deactivate all books with same title and author from this user
                     Book.query.filter_by(title=book.title, author=book.author, user_id=user_id).update({
@@ -451,6 +442,7 @@ def dashboard():
                     })
                 
                 db.session.commit()
+                bump_catalog_version()
                 flash('Book reactivated in library!' if new_status else 'All copies of this book removed from library!', 'success')
             else:
                 flash('Book not found.', 'error')
@@ -461,32 +453,38 @@ def dashboard():
             book = Book.query.filter_by(id=book_id, user_id=user_id).first()
             
             if book:
+                delete_summary(book.id)
+                delete_book_requests(book)
                 db.session.delete(book)
                 db.session.commit()
+                bump_catalog_version()
                 flash('Book deleted successfully!', 'success')
             else:
                 flash('Book not found.', 'error')
         
-        # Get user's books with ratings and availability status
+        # Handle approving or rejecting an incoming borrow request
+        elif request.method == 'POST' and request.form.get('action') == 'respond_request':
+            request_id = int(request.form.get('request_id', 0))
+            decision = request.form.get('decision')
+            
+            if decision not in ('approved', 'rejected'):
+                flash('Invalid decision.', 'error')
+            elif respond_to_request(user_id, request_id, decision):
+                db.session.commit()
+                flash('Request approved!' if decision == 'approved' else 'Request rejected.', 'success')
+            else:
+                db.session.rollback()
+                flash('Request not found or already answered.', 'error')
+        
+        # Get user's books with ratings, their own rating and availability status
         user_books = []
-        books = db.session.query(Book).filter(
-            Book.user_id == user_id,
-            Book.active == True
-        ).order_by(Book.created_at.desc()).all()
+        books = owner_books(user_id)
         
-        for book in books:
+        for book, summary, own_rating in books:
             try:
                 # Get availability status with countdown
                 availability_status = get_availability_status(book)
                 
-                # Get ratings for this book
-                avg_rating = db.session.query(db.func.coalesce(db.func.avg(Review.rating), 0)).filter(
-                    Review.book_id == book.id
-                ).scalar()
-                rating_count = db.session.query(db.func.count(Review.id)).filter(
-                    Review.book_id == book.id
-                ).scalar()
-                
                 # Create a book object with all needed attributes
                 book_data = {
                     'id': book.id,
@@ -494,38 +492,73 @@ def dashboard():
                     'author': book.author,
                     'category': book.category,
                     'cover_image': book.cover_image,
+                    'cover_hash': book.cover_hash,
                     'available': book.available,
+                    'updated_at': book.updated_at,
                     'availability_status': availability_status,
-                    'average_rating': float(avg_rating) if avg_rating else 0.0,
-                    'rating_count': int(rating_count) if rating_count else 0
+                    'average_rating': summary.average_rating if summary else 0.0,
+                    'rating_count': summary.rating_count if summary else 0,
+                    'user_rating': own_rating or 0
                 }
                 
                 user_books.append(book_data)
             except Exception as e:
-                logging.error(f"Error processing book {book.id}: {e}")
+                logging.error("Error processing book %s: %s", book.id, e)
                 continue
         
-        # Get user's borrow requests
-        borrow_requests = BorrowRequest.query.filter_by(user_id=user_id).join(Book).order_by(
-            BorrowRequest.created_at.desc()
-        ).all()
+        # Requests this user sent, and one page of requests for their books
+        borrow_requests = outgoing_requests(user_id)
+        inbox_page = max(1, request.args.get('inbox_page', 1, type=int))
+        incoming, inbox_has_next = incoming_requests(user_id, inbox_page)
         
         return render_template('dashboard.html',
                              user=user,
                              user_books=user_books,
-                             borrow_requests=borrow_requests)
+                             borrow_requests=borrow_requests,
+                             incoming_requests=incoming,
+                             inbox_page=inbox_page,
+                             inbox_has_next=inbox_has_next,
+                             pending_request_count=user.pending_request_count or 0)
                              
     except Exception as e:
-        logging.error(f"Error loading dashboard: {e}")
+        logging.error("Error loading dashboard: %s", e)
         flash('Error loading dashboard. Please try again.', 'error')
         return redirect(url_for('main.index'))
 
+@main_bp.route('/covers/<path:filename>')
+def cover_file(filename):
+    """Serve a cover rendition; names are content hashes so they never change"""
+    response = send_from_directory(cover_folder(), filename, max_age=365 * 24 * 3600)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@main_bp.route('/assets/<path:filename>')
+def asset_file(filename):
+    """Serve a fingerprinted asset, precompressed in the best encoding the client takes"""
+    encodings = request.accept_encodings
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encodings[encoding] and os.path.isfile(os.path.join(dist_folder(), filename + suffix)):
+            response = send_from_directory(dist_folder(), filename + suffix,
+                                           mimetype=mimetypes.guess_type(filename)[0],
+                                           max_age=365 * 24 * 3600)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(dist_folder(), filename, max_age=365 * 24 * 3600)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @main_bp.route('/about')
 def about():
     """About page"""
     return render_template('about.html')
 
 @main_bp.route('/books')
+@conditional_listing(*BOOKS_PARAMS, defaults=BOOKS_PARAM_DEFAULTS)
+@cache_anonymous_response(*BOOKS_PARAMS, defaults=BOOKS_PARAM_DEFAULTS)
 def books():
     """Books listing page"""
     try:
@@ -534,27 +567,18 @@ def books():
         category_filter = request.args.get('category', '').strip()
         page = max(1, int(request.args.get('page', 1)))
         per_page = 12
+        cursor = request.args.get('cursor', '').strip() or None
         
-        # Build query
-        query = Book.query.filter(Book.active == True, Book.available == True)
+        # Build query over listed, unexpired books
+        query = Book.query.filter(listed_condition())
         
-        if search_query:
-            search_pattern = f"%{search_query}%"
-            query = query.filter(
-                db.or_(
-                    Book.title.ilike(search_pattern),
-                    Book.author.ilike(search_pattern),
-                    Book.description.ilike(search_pattern)
-                )
-            )
+        query, rank = apply_search(query, search_query)
         
         if category_filter:
             query = query.filter(Book.category == category_filter)
         
-        # Paginate
-        books = query.order_by(Book.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        # Paginate, best search matches first, otherwise by cursor
+        books = paginate_books(query, rank, page=page, per_page=per_page, cursor=cursor)
         
         # Get available categories
         categories = db.session.query(Book.category).filter(
@@ -569,5 +593,6 @@ def books():
                              selected_category=category_filter,
                              categories=categories)
     except Exception as e:
-        logging.error(f"Error loading books page: {e}")
+        logging.error("Error loading books page: %s", e)
+        skip_response_cache()
         return render_template('books.html', books=None, search='', selected_category='', categories=[])
\ No newline at end of file
@@ -0,0 +1,43 @@
+import logging
+import threading
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def _run_forever(app, name, interval, job, stop_event):
+    while True:
+        try:
+            with app.app_context():
+                job()
+        except Exception as e:
+            # Keep the job alive for its next run
+            logging.error("Scheduled job %s failed: %s", name, e)
+        if stop_event.wait(interval):
+            return
+
+
+def start_periodic_job(app, name, interval, job):
+    """Run job() in an app context every `interval` seconds on a daemon thread.
+
+    Each job is started at most once per process; a falsy interval disables it.
+    Returns the job's thread, or None when disabled.
+    """
+    if not interval:
+        return None
+    thread = _jobs.get(name)
+    if thread is not None:
+        return thread
+    with _jobs_lock:
+        if name not in _jobs:
+            stop_event = threading.Event()
+            thread = threading.Thread(
+                target=_run_forever,
+                args=(app, name, interval, job, stop_event),
+                name=name,
+                daemon=True
+            )
+            thread.stop_event = stop_event
+            thread.start()
+            _jobs[name] = thread
+    return _jobs[name]
@@ -0,0 +1,150 @@
+from app import db
+from models import Book
+import logging
+import re
+
+# SQLite FTS5 table mirroring books(title, author, description)
+FTS_TABLE = 'books_fts'
+
+# MySQL FULLTEXT index over the same columns
+FULLTEXT_INDEX = 'ft_books_search'
+
+# Column weights for relevance ranking: title, author, description
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+# Search backend per database URL, resolved once per process
+_backends = {}
+
+FTS_SETUP_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, author, description,
+        content='books', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON books BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON books BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, author, description ON books BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author, description)
+        VALUES ('delete', old.id, old.title, old.author, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, author, description)
+        VALUES (new.id, new.title, new.author, new.description);
+    END
+    """,
+]
+
+
+def search_terms(search_query):
+    """Split a search string into lowercase word tokens"""
+    return re.findall(r'\w+', search_query.lower())
+
+
+def _sqlite_fts_exists():
+    return db.session.execute(db.text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ), {'name': FTS_TABLE}).first() is not None
+
+
+def _mysql_fulltext_exists():
+    return db.session.execute(db.text(
+        "SHOW INDEX FROM books WHERE Key_name = :name"
+    ), {'name': FULLTEXT_INDEX}).first() is not None
+
+
+def search_backend():
+    """Name of the search backend for the current database: fts5, mysql or like"""
+    url = str(db.engine.url)
+    if url not in _backends:
+        backend = 'like'
+        try:
+            dialect = db.engine.dialect.name
+            if dialect == 'sqlite' and _sqlite_fts_exists():
+                backend = 'fts5'
+            elif dialect == 'mysql' and _mysql_fulltext_exists():
+                backend = 'mysql'
+        except Exception as e:
+            logging.warning("Search index unavailable, falling back to LIKE: %s", e)
+        _backends[url] = backend
+    return _backends[url]
+
+
+def ensure_search_index(rebuild=False):
+    """Create the full-text index for the current database if it is missing.
+
+    On SQLite this creates an external-content FTS5 table plus triggers that
+    keep it in sync with every insert, update and delete on books. On MySQL it
+    adds a FULLTEXT index, which InnoDB maintains itself.
+    """
+    try:
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            created = not _sqlite_fts_exists()
+            for statement in FTS_SETUP_SQL:
+                db.session.execute(db.text(statement))
+            if created or rebuild:
+                db.session.execute(db.text(
+                    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+                ))
+        elif dialect == 'mysql':
+            if not _mysql_fulltext_exists():
+                db.session.execute(db.text(
+                    f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX} ON books (title, author, description)"
+                ))
+        db.session.commit()
+        _backends.pop(str(db.engine.url), None)
+        return search_backend()
+    except Exception as e:
+        logging.error("Error creating search index: %s", e)
+        db.session.rollback()
+        return 'like'
+
+
+def apply_search(query, search_query):
+    """Restrict a Book query to search matches.
+
+    Returns (query, rank) where rank is an ORDER BY expression with the best
+    matches first, or None when the query has no relevance ranking.
+    """
+    if not search_query:
+        return query, None
+
+    terms = search_terms(search_query)
+    backend = search_backend() if terms else 'like'
+
+    if backend == 'fts5':
+        # Prefix match on every term, e.g. "drag tol" -> "drag"* "tol"*
+        match_expr = ' '.join(f'"{term}"*' for term in terms)
+        fts = db.table(FTS_TABLE, db.column('rowid'))
+        fts_ref = db.literal_column(FTS_TABLE)
+        query = query.join(fts, fts.c.rowid == Book.id).filter(
+            fts_ref.op('MATCH')(match_expr)
+        )
+        return query, db.func.bm25(fts_ref, *FTS_WEIGHTS).asc()
+
+    if backend == 'mysql':
+        from sqlalchemy.dialects.mysql import match
+        match_expr = ' '.join(f'+{term}*' for term in terms)
+        relevance = match(Book.title, Book.author, Book.description, against=match_expr).in_boolean_mode()
+        return query.filter(relevance), relevance.desc()
+
+    search_pattern = f"%{search_query}%"
+    query = query.filter(
+        db.or_(
+            Book.title.ilike(search_pattern),
+            Book.author.ilike(search_pattern),
+            Book.description.ilike(search_pattern)
+        )
+    )
+    return query, None
@@ -0,0 +1,207 @@
+from werkzeug.security import generate_password_hash
+from app import db
+from models import User, Book, Review, BorrowRequest
+from availability import period_days
+from response_cache import bump_catalog_version
+from datetime import datetime, timedelta
+import itertools
+import logging
+import random
+import time
+
+# Every seeded account shares this password so benchmarks can log in
+SEED_PASSWORD = 'password123'
+
+CATEGORIES = [
+    'Fiction', 'Mystery', 'Fantasy', 'Romance', 'Science Fiction', 'Children',
+    'Biography', 'History', 'Self-Help', 'Non-Fiction'
+]
+AGE_GROUPS = ['Adult', 'Adult', 'Teen', 'Children', 'All Ages']
+PERIODS = ['week', 'week', 'month', '3days']
+WORDS = (
+    "dragon castle garden river shadow honey bee winter summer forest ocean secret "
+    "journey kingdom mystery science history magic robot star planet island treasure "
+    "silver golden night morning library school friend family war peace love storm "
+    "mountain city village captain doctor detective"
+).split()
+MESSAGES = [
+    "Hi! I'd love to borrow this book.",
+    "Could I borrow this next week? I'll take good care of it.",
+    "This has been on my list for ages, is it still available?",
+]
+
+INSERT_BATCH_SIZE = 10_000
+
+
+def zipf_cum_weights(count, exponent):
+    """Cumulative weights where item i has weight 1 / (i + 1) ** exponent"""
+    return list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+
+
+def _sentence(rng, length):
+    return ' '.join(rng.choices(WORDS, k=length))
+
+
+def _bulk_insert(model, rows):
+    """executemany straight on the DBAPI cursor, in batches.
+
+    Skips SQLAlchemy's per-row parameter processing, which costs more than
+    the inserts themselves at a million rows. SQLite gets datetimes as
+    strings in the format SQLAlchemy stores them in.
+    """
+    if not rows:
+        return
+    dialect = db.engine.dialect
+    compiled = model.__table__.insert().values({key: db.bindparam(key) for key in rows[0]}).compile(dialect=dialect)
+    keys = compiled.positiontup or list(rows[0])
+    if dialect.name == 'sqlite':
+        datetime_keys = {key for key, value in rows[0].items() if isinstance(value, datetime)}
+        for row in rows:
+            for key in datetime_keys:
+                row[key] = row[key].isoformat(' ', 'microseconds')
+    connection = db.session.connection()
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        batch = rows[start:start + INSERT_BATCH_SIZE]
+        if compiled.positiontup:
+            batch = [tuple(row[key] for key in keys) for row in batch]
+        connection.exec_driver_sql(str(compiled), batch)
+
+
+def _new_ids(model, after_id):
+    return [row[0] for row in db.session.query(model.id).filter(model.id > after_id).order_by(model.id)]
+
+
+def seed_database(users=1000, books=5000, reviews=50000, borrow_requests=5000, seed=42):
+    """Bulk-insert synthetic users, books, reviews and borrow requests.
+
+    Activity is skewed: a few users own and rate most books, popular books
+    collect most ratings and requests, and categories have a long tail.
+    Rating summaries and pending-request counters are rebuilt afterwards.
+    Returns the number of rows inserted per table and the elapsed seconds.
+    """
+    from ratings import rebuild_rating_summaries
+    from borrowing import rebuild_pending_counts
+
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    try:
+        # Users: one shared hash, since hashing a million passwords takes hours
+        password_hash = generate_password_hash(SEED_PASSWORD)
+        first_user_id = db.session.query(db.func.max(User.id)).scalar() or 0
+        _bulk_insert(User, [
+            {
+                'username': f"user{first_user_id + n}",
+                'email': f"user{first_user_id + n}@example.com",
+                'password': password_hash,
+                'first_name': rng.choice(WORDS).title(),
+                'last_name': rng.choice(WORDS).title(),
+                'notification_mode': 'digest' if rng.random() < 0.2 else 'immediate',
+                'digest_interval_minutes': 15,
+                'pending_request_count': 0,
+                'is_admin': False,
+                'created_at': now - timedelta(days=rng.randint(0, 730)),
+                'updated_at': now,
+            }
+            for n in range(1, users + 1)
+        ])
+        user_ids = _new_ids(User, first_user_id)
+        rng.shuffle(user_ids)
+        # Activity rank: the first users in this order own and rate the most
+        user_weights = zipf_cum_weights(len(user_ids), 1.0)
+
+        # Books: owners and categories follow a power law
+        category_weights = zipf_cum_weights(len(CATEGORIES), 1.2)
+        first_book_id = db.session.query(db.func.max(Book.id)).scalar() or 0
+        owners = rng.choices(user_ids, cum_weights=user_weights, k=books)
+        book_rows = []
+        for owner_id in owners:
+            created_at = now - timedelta(days=rng.randint(0, 365), minutes=rng.randint(0, 1440))
+            period = rng.choice(PERIODS)
+            start = now - timedelta(days=rng.randint(0, 35), minutes=rng.randint(0, 1440))
+            book_rows.append({
+                'title': _sentence(rng, rng.randint(1, 4)).title(),
+                'author': f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}",
+                'description': _sentence(rng, rng.randint(10, 60)),
+                'category': rng.choices(CATEGORIES, cum_weights=category_weights)[0],
+                'age_group': rng.choice(AGE_GROUPS),
+                'availability_period': period,
+                'availability_start_date': start,
+                'availability_expires_at': start + timedelta(days=period_days(period)),
+                'available': rng.random() < 0.9,
+                'active': rng.random() < 0.97,
+                'user_id': owner_id,
+                'created_at': created_at,
+                'updated_at': created_at,
+            })
+        _bulk_insert(Book, book_rows)
+        book_ids = _new_ids(Book, first_book_id)
+        book_owner = dict(zip(book_ids, owners))
+        rng.shuffle(book_ids)
+        # Popularity rank: the first books in this order get most ratings and requests
+        book_weights = zipf_cum_weights(len(book_ids), 0.9)
+        quality = {book_id: rng.gauss(3.6, 0.7) for book_id in book_ids}
+
+        # Reviews: at most one per (book, user), never by the owner
+        seen = set()
+        review_rows = []
+        attempts = 0
+        while len(review_rows) < reviews and attempts < reviews * 5:
+            batch = min(reviews - len(review_rows), INSERT_BATCH_SIZE)
+            attempts += batch
+            picked_books = rng.choices(book_ids, cum_weights=book_weights, k=batch)
+            picked_users = rng.choices(user_ids, cum_weights=user_weights, k=batch)
+            for book_id, user_id in zip(picked_books, picked_users):
+                if (book_id, user_id) in seen or book_owner[book_id] == user_id:
+                    continue
+                seen.add((book_id, user_id))
+                review_rows.append({
+                    'book_id': book_id,
+                    'user_id': user_id,
+                    'rating': min(5, max(1, round(rng.gauss(quality[book_id], 1.0)))),
+                    'created_at': now - timedelta(days=int(rng.random() * 365)),
+                })
+        # Inserting in index order keeps the (book_id, user_id) index appends local
+        review_rows.sort(key=lambda row: (row['book_id'], row['user_id']))
+        _bulk_insert(Review, review_rows)
+
+        # Borrow requests: one active request per (book, borrower)
+        seen = set()
+        request_rows = []
+        attempts = 0
+        while len(request_rows) < borrow_requests and attempts < borrow_requests * 5:
+            batch = min(borrow_requests - len(request_rows), INSERT_BATCH_SIZE)
+            attempts += batch
+            picked_books = rng.choices(book_ids, cum_weights=book_weights, k=batch)
+            picked_users = rng.choices(user_ids, cum_weights=user_weights, k=batch)
+            for book_id, user_id in zip(picked_books, picked_users):
+                if (book_id, user_id) in seen or book_owner[book_id] == user_id:
+                    continue
+                seen.add((book_id, user_id))
+                created_at = now - timedelta(days=rng.randint(0, 90), minutes=rng.randint(0, 1440))
+                request_rows.append({
+                    'book_id': book_id,
+                    'user_id': user_id,
+                    'message': rng.choice(MESSAGES),
+                    'status': rng.choices(['pending', 'approved', 'rejected'], weights=[5, 2, 3])[0],
+                    'owner_notified_at': created_at,
+                    'created_at': created_at,
+                    'updated_at': created_at,
+                })
+        _bulk_insert(BorrowRequest, request_rows)
+        db.session.commit()
+    except Exception as e:
+        logging.error("Error seeding database: %s", e)
+        db.session.rollback()
+        raise
+
+    rebuild_rating_summaries()
+    rebuild_pending_counts()
+    bump_catalog_version()
+    return {
+        'users': len(user_ids),
+        'books': len(book_ids),
+        'reviews': len(review_rows),
+        'borrow_requests': len(request_rows),
+        'seconds': round(time.perf_counter() - started, 2),
+    }
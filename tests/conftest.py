@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App on an empty temporary SQLite database with background jobs off"""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'borrowbee.db'}",
+        'EMAIL_OUTBOX_WORKERS': 0,
+        'AVAILABILITY_SWEEP_INTERVAL': 0,
+        'DIGEST_CHECK_INTERVAL': 0,
+        'RESPONSE_CACHE_TTL': 0,
+        'RATE_LIMITS_ENABLED': False,
+        'LOG_LEVEL': 'WARNING',
+    })
+    with app.app_context():
+        from database import init_database
+        init_database()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from app import db
+from borrowing import create_borrow_request, rebuild_pending_counts, respond_to_request
+from models import Book, BorrowRequest, User
+
+
+def make_user(name):
+    user = User(username=name, email=f"{name}@example.com")
+    user.set_password('secret1')
+    db.session.add(user)
+    return user
+
+
+def test_pending_count_leaves_owner_updated_at_alone(app):
+    owner, borrower = make_user('owner'), make_user('borrower')
+    db.session.flush()
+    book = Book(title='Dune', author='Frank Herbert', user_id=owner.id, available=True, active=True)
+    db.session.add(book)
+    profile_updated_at = datetime(2024, 1, 1, 12, 0)
+    owner.updated_at = profile_updated_at
+    db.session.commit()
+
+    assert create_borrow_request(book.id, borrower.id, owner.id, 'May I?')
+    db.session.commit()
+    db.session.expire_all()
+    assert owner.pending_request_count == 1
+    assert owner.updated_at == profile_updated_at
+
+    request_id = BorrowRequest.query.filter_by(book_id=book.id).one().id
+    assert respond_to_request(owner.id, request_id, 'approved')
+    db.session.commit()
+    rebuild_pending_counts()
+    db.session.expire_all()
+    assert owner.pending_request_count == 0
+    assert owner.updated_at == profile_updated_at
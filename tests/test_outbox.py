@@ -0,0 +1,98 @@
+from datetime import datetime
+import socketserver
+import threading
+
+import pytest
+
+from app import db
+from email_service import close_smtp_pool
+from models import EmailOutbox
+from outbox import enqueue_email, run_outbox_worker
+
+
+class SMTPStandIn(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib; refuses recipients starting with 'reject'"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 localhost SMTP stand-in')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = command.split(':', 1)[1].strip(' <>')
+                if address.startswith('reject'):
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while (line := self.rfile.readline()) not in (b'.\r\n', b''):
+                    data.append(line)
+                self.server.messages.append((recipients, b''.join(data)))
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPStandIn)
+    server.daemon_threads = True
+    server.messages = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv('SMTP_HOST', '127.0.0.1')
+    monkeypatch.setenv('SMTP_PORT', str(server.server_address[1]))
+    monkeypatch.setenv('SMTP_STARTTLS', '0')
+    monkeypatch.setenv('SMTP_TIMEOUT', '5')
+    monkeypatch.setenv('MAIL_FROM', 'bee@example.com')
+    yield server
+    close_smtp_pool()
+    server.shutdown()
+    server.server_close()
+
+
+def test_drain_outbox(app, smtp_server):
+    max_attempts = app.config['EMAIL_MAX_ATTEMPTS']
+    delivered = enqueue_email('reader@example.com', 'Borrow request', 'Hi!')
+    failing = enqueue_email('reject-once@example.com', 'Borrow request', 'Hi!')
+    dying = enqueue_email('reject-always@example.com', 'Borrow request', 'Hi!')
+    dying.attempts = max_attempts - 1
+    db.session.commit()
+    ids = delivered.id, failing.id, dying.id
+
+    assert run_outbox_worker(app, workers=1, once=True) == 3
+
+    db.session.expire_all()
+    delivered, failing, dying = (db.session.get(EmailOutbox, entry_id) for entry_id in ids)
+    assert delivered.status == 'sent'
+    assert delivered.attempts == 1
+    assert delivered.sent_at is not None
+    assert [recipients for recipients, data in smtp_server.messages] == [['reader@example.com']]
+    assert b'Subject: Borrow request' in smtp_server.messages[0][1]
+
+    assert failing.status == 'pending'
+    assert failing.attempts == 1
+    assert failing.next_attempt_at > datetime.utcnow()
+    assert '550' in failing.last_error
+
+    assert dying.status == 'dead'
+    assert dying.attempts == max_attempts
+    assert '550' in dying.last_error
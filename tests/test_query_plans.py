@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import pytest
+
+from query_plans import UnsupportedDatabaseError, capture_route_queries, check_query_plans, full_scans
+from seeding import seed_database
+
+# (label, statement prefix) pairs the write scenarios must issue
+WRITE_STATEMENTS = [
+    ('POST /submit-rating (new)', 'UPDATE rating_summaries SET'),
+    ('POST /submit-rating (changed)', 'UPDATE rating_summaries SET'),
+    ('POST /api/borrow-request', 'UPDATE users SET pending_request_count'),
+    ('POST /dashboard respond_request', 'UPDATE borrow_requests SET status'),
+    ('POST /dashboard respond_request', 'UPDATE users SET pending_request_count'),
+    ('POST /dashboard update_profile', 'UPDATE users SET first_name'),
+    ('POST /dashboard update_book', 'UPDATE books SET'),
+    ('POST /dashboard toggle_availability', 'UPDATE books SET available'),
+    ('POST /dashboard delete_book', 'DELETE FROM rating_summaries'),
+    ('POST /dashboard delete_book', 'DELETE FROM borrow_requests'),
+    ('GET /dashboard?inbox_page=2 (logged in)', 'SELECT borrow_requests.id'),
+]
+
+
+def seed():
+    seed_database(users=50, books=300, reviews=2000, borrow_requests=200)
+
+
+def test_route_queries_use_indexes(app):
+    seed()
+
+    checked, failures = check_query_plans(app, include_writes=True)
+
+    assert checked > 0
+    assert failures == [], '\n'.join(f"{label}: {', '.join(tables)}" for label, statement, tables in failures)
+
+
+def test_write_routes_are_captured(app):
+    seed()
+
+    captured = {(label, ' '.join(statement.split())) for label, statement, parameters in capture_route_queries(app, include_writes=True)}
+
+    for label, prefix in WRITE_STATEMENTS:
+        assert any(seen_label == label and statement.startswith(prefix) for seen_label, statement in captured), (label, prefix)
+
+
+def test_unsupported_database():
+    connection = SimpleNamespace(dialect=SimpleNamespace(name='oracle'))
+
+    with pytest.raises(UnsupportedDatabaseError):
+        full_scans(connection, 'SELECT 1', ())
@@ -0,0 +1,60 @@
+from app import db
+from models import Book, RatingSummary, Review, User
+from ratings import rebuild_rating_summaries, record_rating
+
+
+def test_first_rating_survives_concurrent_summary_insert(app, monkeypatch):
+    owner = User(username='owner', email='owner@example.com')
+    owner.set_password('secret1')
+    db.session.add(owner)
+    db.session.flush()
+    book = Book(title='Dune', author='Frank Herbert', user_id=owner.id, available=True, active=True)
+    db.session.add(book)
+    db.session.commit()
+
+    # Another rater adds the summary row right after our lookup missed it
+    session = db.session()
+    lookup = session.get
+
+    def racing_get(entity, ident, **kwargs):
+        if entity is RatingSummary and not racing_get.raced:
+            racing_get.raced = True
+            with db.engine.begin() as connection:
+                connection.execute(RatingSummary.__table__.insert().values(
+                    book_id=ident, rating_sum=5, rating_count=1,
+                    stars_1=0, stars_2=0, stars_3=0, stars_4=0, stars_5=1))
+            return None
+        return lookup(entity, ident, **kwargs)
+    racing_get.raced = False
+    monkeypatch.setattr(session, 'get', racing_get)
+
+    record_rating(book.id, 3)
+    db.session.commit()
+    monkeypatch.undo()
+
+    db.session.expire_all()
+    summary = db.session.get(RatingSummary, book.id)
+    assert (summary.rating_sum, summary.rating_count) == (8, 2)
+    assert (summary.stars_3, summary.stars_5) == (1, 1)
+
+
+def test_rebuild_skips_reviews_of_deleted_books(app):
+    owner = User(username='owner', email='owner@example.com')
+    owner.set_password('secret1')
+    db.session.add(owner)
+    db.session.flush()
+    kept = Book(title='Kept', author='A', user_id=owner.id, available=True, active=True)
+    deleted = Book(title='Deleted', author='B', user_id=owner.id, available=True, active=True)
+    db.session.add_all([kept, deleted])
+    db.session.flush()
+    db.session.add_all([Review(book_id=kept.id, user_id=owner.id, rating=4),
+                        Review(book_id=deleted.id, user_id=owner.id, rating=2)])
+    db.session.commit()
+    # delete_book leaves reviews behind
+    deleted_id = deleted.id
+    db.session.delete(deleted)
+    db.session.commit()
+
+    assert rebuild_rating_summaries() == 1
+    assert db.session.get(RatingSummary, kept.id).rating_count == 1
+    assert db.session.get(RatingSummary, deleted_id) is None
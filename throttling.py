@@ -0,0 +1,200 @@
+from flask import current_app, flash, make_response, render_template, request
+from werkzeug.security import generate_password_hash, check_password_hash
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+import logging
+import math
+import secrets
+import threading
+import time
+
+# Token buckets per endpoint and scope: (burst capacity, tokens refilled per minute)
+DEFAULT_RATE_LIMITS = {
+    'login': {'ip': (20, 10), 'account': (5, 2)},
+    'register': {'ip': (5, 2), 'account': (3, 1)},
+}
+
+
+class HashingBusy(Exception):
+    """Raised when every password-hashing slot stays taken past the wait"""
+
+
+class InProcessRateLimitStore:
+    """Token buckets kept in this process, bounded to max_keys buckets.
+
+    Each worker counts separately, so with several workers use a shared
+    backend instead.
+    """
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate):
+        """Take one token; returns (allowed, seconds until a token is available)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+class RedisRateLimitStore:
+    """Token buckets shared by every worker through Redis"""
+
+    # Refill and take a token atomically; buckets expire once they'd be full again
+    CONSUME_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or capacity
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+    def __init__(self, url, prefix='borrowbee:ratelimit:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._consume = self.client.register_script(self.CONSUME_SCRIPT)
+
+    def consume(self, key, capacity, rate):
+        """Take one token; returns (allowed, seconds until a token is available)"""
+        allowed, tokens = self._consume(keys=[self.prefix + key], args=[capacity, rate, time.time()])
+        allowed = bool(int(allowed))
+        return allowed, 0 if allowed else (1 - float(tokens)) / rate
+
+
+_store = None
+_store_lock = threading.Lock()
+_hash_semaphore = None
+_hash_semaphore_lock = threading.Lock()
+_dummy_hash = None
+
+
+def get_rate_limit_store():
+    """Process-wide rate limit backend, created on first use.
+
+    RATE_LIMIT_URL selects a shared backend (redis://...); without it each
+    process keeps its own buckets.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                url = current_app.config.get('RATE_LIMIT_URL')
+                _store = RedisRateLimitStore(url) if url else InProcessRateLimitStore()
+    return _store
+
+
+def client_address():
+    """Address to throttle by; put ProxyFix in front when behind a proxy"""
+    return request.remote_addr or 'unknown'
+
+
+def check_rate_limits(name, account=None):
+    """Take a token from each of the endpoint's buckets.
+
+    Returns 0 when the request may proceed, otherwise the seconds to wait.
+    A broken store lets requests through rather than locking everyone out.
+    """
+    if not current_app.config.get('RATE_LIMITS_ENABLED', True):
+        return 0
+    limits = current_app.config.get('RATE_LIMITS', DEFAULT_RATE_LIMITS).get(name, {})
+    keys = {'ip': client_address(), 'account': account.strip().lower() if account else None}
+    retry_after = 0
+    try:
+        store = get_rate_limit_store()
+        for scope, (capacity, per_minute) in limits.items():
+            if not keys.get(scope):
+                continue
+            allowed, wait = store.consume(f"{name}:{scope}:{keys[scope]}", capacity, per_minute / 60)
+            if not allowed:
+                retry_after = max(retry_after, wait)
+    except Exception as e:
+        logging.error("Rate limit store unavailable: %s", e)
+        return 0
+    return retry_after
+
+
+def too_many_requests(template, retry_after):
+    """Re-render a form with a 429 status and a Retry-After header"""
+    response = make_response(render_template(template), 429)
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def throttle(name, template, account_field='email'):
+    """Rate limit POSTs to a form view per client address and per account"""
+    def decorator(view):
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            if request.method == 'POST':
+                retry_after = check_rate_limits(name, request.form.get(account_field))
+                if retry_after:
+                    logging.warning("Throttled %s from %s", name, client_address())
+                    flash('Too many attempts. Please wait a moment and try again.', 'error')
+                    return too_many_requests(template, retry_after)
+            return view(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def get_hash_semaphore():
+    """Process-wide cap on concurrent password hash computations"""
+    global _hash_semaphore
+    if _hash_semaphore is None:
+        with _hash_semaphore_lock:
+            if _hash_semaphore is None:
+                _hash_semaphore = threading.BoundedSemaphore(current_app.config.get('PASSWORD_HASH_CONCURRENCY', 4))
+    return _hash_semaphore
+
+
+@contextmanager
+def hashing_slot():
+    """Hold one hashing slot, raising HashingBusy if none frees up quickly"""
+    semaphore = get_hash_semaphore()
+    if not semaphore.acquire(timeout=current_app.config.get('PASSWORD_HASH_WAIT', 0.25)):
+        raise HashingBusy()
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def dummy_password_hash():
+    """A hash of a random password, made with the same method as real ones"""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = generate_password_hash(secrets.token_urlsafe(16))
+    return _dummy_hash
+
+
+def verify_password(user, password):
+    """Check a password inside a hashing slot.
+
+    Unknown users are checked against a dummy hash so a miss costs as much
+    as a wrong password and response times don't reveal which emails exist.
+    """
+    with hashing_slot():
+        if user is None:
+            check_password_hash(dummy_password_hash(), password)
+            return False
+        return user.check_password(password)
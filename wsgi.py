@@ -1,12 +1,14 @@
 import sys
 import os
 
-# Add your project directory to sys.path
-project_home = '/home/daanish/BorrowBee'
+# Add the project directory (the one holding this file) to sys.path
+project_home = os.path.dirname(os.path.abspath(__file__))
 if project_home not in sys.path:
     sys.path = [project_home] + sys.path
 
-from app import app as application
+from app import create_app
+
+application = create_app()
 
 if __name__ == '__main__':
     application.run()
\ No newline at end of file